@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+
+from .serializers import IngredientSerializer, TagSerializer
+
+CACHE_PREFIX = 'catalog'
+LOCAL_TIMEOUT = 60
+MAX_AGE = 60
+
+CatalogEntry = namedtuple('CatalogEntry',
+                          ('version', 'expires', 'etag', 'content'))
+
+
+class CatalogCache:
+    """Кэш каталога в памяти процесса в виде готового JSON.
+
+    Версия каталога хранится в кэше Django: если кэш общий для процессов,
+    изменение каталога в одном процессе сбрасывает его во всех. Локальная
+    копия в любом случае живет не дольше LOCAL_TIMEOUT секунд.
+    """
+
+    def __init__(self, name, get_data):
+        self.name = name
+        self.get_data = get_data
+        self.version_key = f'{CACHE_PREFIX}:{name}:version'
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid4().hex, timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def is_fresh(self, entry, version):
+        return (entry is not None and entry.version == version
+                and entry.expires > time.monotonic())
+
+    def build(self, version):
+        content = JSONRenderer().render(self.get_data())
+        return CatalogEntry(
+            version=version,
+            expires=time.monotonic() + LOCAL_TIMEOUT,
+            etag=quote_etag(hashlib.sha1(content).hexdigest()),
+            content=content,
+        )
+
+    def get(self):
+        """Получить актуальную запись каталога"""
+        version = self.get_version()
+        entry = self._entry
+        if self.is_fresh(entry, version):
+            return entry
+        with self._lock:
+            entry = self._entry
+            if not self.is_fresh(entry, version):
+                entry = self._entry = self.build(version)
+        return entry
+
+    def invalidate(self):
+        self._entry = None
+        cache.set(self.version_key, uuid4().hex, timeout=None)
+
+
+tags_catalog = CatalogCache(
+    'tags', lambda: TagSerializer(Tag.objects.all(), many=True).data)
+ingredients_catalog = CatalogCache(
+    'ingredients',
+    lambda: IngredientSerializer(Ingredient.objects.all(), many=True).data)
+
+
+class CatalogListMixin:
+    """Отдача полного списка объектов из кэша каталога"""
+    catalog = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        entry = self.catalog.get()
+        if entry.etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry.content,
+                                    content_type='application/json')
+        response['ETag'] = entry.etag
+        response['Cache-Control'] = f'public, max-age={MAX_AGE}'
+        return response
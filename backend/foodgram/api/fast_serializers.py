@@ -0,0 +1,105 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+
+from recipes.images import get_variant_urls_for
+from recipes.models import Recipe, RecipeIngredient
+from users.models import User
+
+RECIPE_FIELDS = ('id', 'name', 'image', 'image_variants_for', 'text',
+                 'cooking_time', 'author_id', 'is_favorited',
+                 'is_in_shopping_cart')
+TAG_KEYS = ('id', 'name', 'color', 'slug')
+TAG_FIELDS = ('recipe_id', 'tag__id', 'tag__name', 'tag__color',
+              'tag__slug')
+INGREDIENT_KEYS = ('id', 'name', 'measurement_unit', 'amount')
+INGREDIENT_FIELDS = ('recipe_id', 'ingredient_id', 'ingredient__name',
+                     'ingredient__measurement_unit', 'amount')
+AUTHOR_KEYS = ('email', 'id', 'username', 'first_name', 'last_name',
+               'is_subscribed')
+
+
+def get_value_fields(queryset):
+    """Поля RECIPE_FIELDS и поля сортировки для пагинации по ключу"""
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    extra = (field.lstrip('-') for field in ordering
+             if isinstance(field, str))
+    return RECIPE_FIELDS + tuple(
+        field for field in extra if field not in RECIPE_FIELDS)
+
+
+def group_by_recipe(rows, keys):
+    """Сгруппировать строки (recipe_id, *значения) по рецептам"""
+    grouped = defaultdict(list)
+    for recipe_id, *values in rows:
+        grouped[recipe_id].append(dict(zip(keys, values)))
+    return grouped
+
+
+class RecipeListSerializer:
+    """Быстрая сериализация списка рецептов.
+
+    Принимает строки Recipe.objects.with_user_flags(...).values(
+    *RECIPE_FIELDS) и возвращает те же данные, что RecipeGETSerializer,
+    без создания моделей и полей сериализаторов.
+    """
+
+    def __init__(self, rows, request):
+        self.rows = list(rows)
+        self.request = request
+
+    def build_url(self, url):
+        if url is None or self.request is None:
+            return url
+        return self.request.build_absolute_uri(url)
+
+    def get_tags(self, recipe_ids):
+        rows = (Recipe.tags.through.objects
+                .filter(recipe_id__in=recipe_ids)
+                .order_by('tag_id')
+                .values_list(*TAG_FIELDS))
+        return group_by_recipe(rows, TAG_KEYS)
+
+    def get_ingredients(self, recipe_ids):
+        rows = (RecipeIngredient.objects
+                .filter(recipe_id__in=recipe_ids)
+                .order_by('id')
+                .values_list(*INGREDIENT_FIELDS))
+        return group_by_recipe(rows, INGREDIENT_KEYS)
+
+    def get_authors(self, author_ids):
+        user = self.request.user if self.request is not None else None
+        rows = (User.objects.filter(pk__in=author_ids)
+                .with_is_subscribed(user)
+                .values_list(*AUTHOR_KEYS))
+        return {row[1]: dict(zip(AUTHOR_KEYS, row)) for row in rows}
+
+    def to_representation(self, row, tags, ingredients, authors):
+        image = row['image']
+        variants = get_variant_urls_for(image, row['image_variants_for'])
+        return {
+            'id': row['id'],
+            'tags': tags.get(row['id'], []),
+            'author': authors[row['author_id']],
+            'ingredients': ingredients.get(row['id'], []),
+            'is_favorited': row['is_favorited'],
+            'is_in_shopping_cart': row['is_in_shopping_cart'],
+            'name': row['name'],
+            'image': self.build_url(
+                default_storage.url(image) if image else None),
+            'image_variants': {variant: self.build_url(url)
+                               for variant, url in variants.items()},
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        }
+
+    @property
+    def data(self):
+        recipe_ids = [row['id'] for row in self.rows]
+        if not recipe_ids:
+            return []
+        tags = self.get_tags(recipe_ids)
+        ingredients = self.get_ingredients(recipe_ids)
+        authors = self.get_authors({row['author_id'] for row in self.rows})
+        return [self.to_representation(row, tags, ingredients, authors)
+                for row in self.rows]
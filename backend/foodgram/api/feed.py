@@ -0,0 +1,39 @@
+import hashlib
+from uuid import uuid4
+
+from django.core.cache import cache
+
+CACHE_PREFIX = 'feed'
+CACHE_TIMEOUT = 30
+
+
+def get_version_key(user_id):
+    return f'{CACHE_PREFIX}:user:{user_id}:version'
+
+
+def get_feed_cache_key(user_id, url):
+    """Ключ страницы ленты: версия ленты пользователя и адрес запроса"""
+    version_key = get_version_key(user_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid4().hex, timeout=None)
+        version = cache.get(version_key)
+    url_hash = hashlib.sha1(url.encode()).hexdigest()
+    return f'{CACHE_PREFIX}:{user_id}:{version}:{url_hash}'
+
+
+def get_cached_feed(cache_key):
+    return cache.get(cache_key)
+
+
+def cache_feed(cache_key, data):
+    cache.set(cache_key, data, CACHE_TIMEOUT)
+
+
+def invalidate_feed(*user_ids):
+    """Сбросить ленту пользователей после изменения их подписок или отметок.
+
+    Новые рецепты авторов появляются в ленте не позже CACHE_TIMEOUT.
+    """
+    cache.set_many({get_version_key(user_id): uuid4().hex
+                    for user_id in user_ids}, timeout=None)
@@ -0,0 +1,45 @@
+import hashlib
+
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+from recipes.images import get_variant_urls
+
+
+class HashedBase64ImageField(Base64ImageField):
+    """Картинка в base64, имя файла - хеш ее содержимого.
+
+    Если файл с таким именем уже есть, возвращается его имя: хранилище
+    не перезаписывает файлы, а добавило бы к имени случайный суффикс,
+    и у той же картинки появились бы вторые файл и копии.
+    """
+
+    def get_file_name(self, decoded_file):
+        return hashlib.sha256(decoded_file).hexdigest()[:32]
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        if file is None:
+            return file
+        model_field = self.parent.Meta.model._meta.get_field(self.source)
+        name = model_field.generate_filename(None, file.name)
+        if model_field.storage.exists(name):
+            return name
+        return file
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии картинки рецепта"""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        urls = get_variant_urls(recipe)
+        request = self.context.get('request')
+        if request is None:
+            return urls
+        return {variant: url and request.build_absolute_uri(url)
+                for variant, url in urls.items()}
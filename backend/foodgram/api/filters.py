@@ -1,4 +1,5 @@
 import django_filters as filters
+from django.db.models import Exists, OuterRef
 
 from recipes.models import Ingredient, Recipe, Tag
 from users.models import User
@@ -22,9 +23,9 @@ class RecipeFilter(filters.FilterSet):
         (OUT, 0),
     )
     tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
         queryset=Tag.objects.all(),
-        to_field_name='slug'
+        to_field_name='slug',
+        method='get_tags'
     )
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all()
@@ -37,11 +38,23 @@ class RecipeFilter(filters.FilterSet):
         method='get_is_in_shopping_cart',
         choices=CHOICES
     )
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        method='get_ordering',
+        choices=(('popular', 'popular'),)
+    )
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
 
+    def get_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов, без JOIN и дублей строк"""
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value)))
+
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
@@ -53,3 +66,11 @@ class RecipeFilter(filters.FilterSet):
         if value and not user.is_anonymous:
             return queryset.filter(purchase__user=user)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        return queryset.search(value)
+
+    def get_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by(*Recipe.POPULAR_ORDERING)
+        return queryset
@@ -0,0 +1,284 @@
+import json
+import math
+import random
+import tempfile
+from io import StringIO
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.shopping_list import get_content_key, get_shopping_list_digest
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem, Tag)
+from users.authentication import is_cache_shared
+from users.models import Follow, User
+
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaA'
+         'AAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQV'
+         'QImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg==')
+CACHE_KEY_PREFIX = 'benchmark_api'
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark_api',
+    }
+}
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга"""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Seeder:
+    """Синтетический набор данных для замеров"""
+
+    def __init__(self, options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+
+    def sample(self, population, count):
+        return self.random.sample(population, min(count, len(population)))
+
+    def seed(self):
+        options = self.options
+        User.objects.bulk_create(
+            User(username=f'bench{i}', email=f'bench{i}@example.com',
+                 first_name='Имя', last_name='Фамилия', password='!')
+            for i in range(options['users']))
+        self.users = list(User.objects.values_list('pk', flat=True))
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#{i:06x}', slug=f'tag{i}')
+            for i in range(options['tags']))
+        self.tags = list(Tag.objects.values_list('slug', 'pk'))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(options['ingredients']))
+        self.ingredients = list(
+            Ingredient.objects.values_list('pk', flat=True))
+        self.seed_recipes()
+        self.seed_relations()
+
+    def seed_recipes(self):
+        options = self.options
+        Recipe.objects.bulk_create(
+            Recipe(author_id=self.random.choice(self.users),
+                   name=f'Рецепт {i}', image='recipes/images/bench.png',
+                   text='Описание рецепта', cooking_time=30)
+            for i in range(options['recipes']))
+        self.recipes = list(Recipe.objects.values_list('pk', flat=True))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe_id=recipe, ingredient_id=ingredient,
+                             amount=self.random.randint(1, 500))
+            for recipe in self.recipes
+            for ingredient in self.sample(
+                self.ingredients, options['ingredients_per_recipe']))
+        tags = [pk for _, pk in self.tags]
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+            for recipe in self.recipes
+            for tag in self.sample(tags, self.random.randint(1, 2)))
+
+    def seed_relations(self):
+        options = self.options
+        Follow.objects.bulk_create(
+            Follow(user_id=user, author_id=author)
+            for user in self.users
+            for author in self.sample(self.users, options['follows'])
+            if author != user)
+        Favorite.objects.bulk_create(
+            Favorite(user_id=user, recipe_id=recipe)
+            for user in self.users
+            for recipe in self.sample(self.recipes, options['favorites']))
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user_id=user) for user in self.users)
+        carts = dict(ShoppingCart.objects.values_list('user_id', 'pk'))
+        ShoppingCart.recipe.through.objects.bulk_create(
+            ShoppingCart.recipe.through(shoppingcart_id=carts[user],
+                                        recipe_id=recipe)
+            for user in self.users
+            for recipe in self.sample(self.recipes, options['cart']))
+        # bulk_create не отправляет сигналы, поэтому списки покупок
+        # и счетчики рецептов пересчитываются после наполнения.
+        ShoppingListItem.objects.rebuild()
+        call_command('recount_recipes', stdout=StringIO())
+
+
+class Command(BaseCommand):
+    help = ('Замер времени и количества запросов к БД для основных '
+            'эндпоинтов API на синтетических данных во временной БД')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--tags', type=int, default=5)
+        parser.add_argument('--ingredients', type=int, default=1000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Подписок на пользователя')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Избранных рецептов на пользователя')
+        parser.add_argument('--cart', type=int, default=10,
+                            help='Рецептов в списке покупок пользователя')
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--cache', choices=('configured', 'locmem'),
+            default='configured',
+            help='Кэш из настроек (с префиксом ключей benchmark_api) '
+                 'или кэш в памяти процесса')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(MEDIA_ROOT=media_root,
+                                       CACHES=self.get_caches(options)):
+                    results = self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        report = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
+
+    def get_caches(self, options):
+        """Кэши для замеров.
+
+        Ключи настроенного кэша получают свой префикс, а между замерами
+        удаляются отдельные ключи: cache.clear() очистил бы Redis целиком.
+        """
+        if options['cache'] == 'locmem':
+            return LOCMEM_CACHES
+        return {alias: {**config, 'KEY_PREFIX': CACHE_KEY_PREFIX}
+                for alias, config in settings.CACHES.items()}
+
+    def measure(self, options, request, before=None):
+        """Выполнить запрос несколько раз и собрать статистику"""
+        timings = []
+        queries = []
+        for i in range(options['warmup'] + options['iterations']):
+            if before is not None:
+                before()
+            with CaptureQueriesContext(connection) as context:
+                started = perf_counter()
+                response = request(i)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = (perf_counter() - started) * 1000
+            assert response.status_code < 400, response.status_code
+            if i >= options['warmup']:
+                timings.append(elapsed)
+                queries.append(len(context.captured_queries))
+        return {
+            'iterations': len(timings),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': max(queries),
+        }
+
+    def measure_connections(self, options, request):
+        """Сравнить запросы с новым и с постоянным соединением к БД.
+
+        Тестовый клиент не закрывает соединения после ответа, поэтому
+        это делается перед каждым запросом, как в обработчике WSGI.
+        """
+        settings_dict = connection.settings_dict
+        old_max_age = settings_dict['CONN_MAX_AGE']
+        results = {}
+        try:
+            for name, max_age in (('connection_new', 0),
+                                  ('connection_persistent', None)):
+                settings_dict['CONN_MAX_AGE'] = max_age
+                connection.close()
+                results[name] = self.measure(
+                    options, request, before=close_old_connections)
+        finally:
+            settings_dict['CONN_MAX_AGE'] = old_max_age
+            connection.close()
+        return results
+
+    def run_benchmarks(self, options):
+        seeder = Seeder(options)
+        seeder.seed()
+        user = User.objects.get(pk=seeder.users[0])
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}')
+        tag_slug = seeder.tags[0][0]
+        author = seeder.users[-1]
+
+        def recipe_data(i):
+            return {
+                'ingredients': [
+                    {'id': ingredient, 'amount': i % 100 + 1}
+                    for ingredient in seeder.sample(
+                        seeder.ingredients,
+                        options['ingredients_per_recipe'])],
+                'tags': [seeder.tags[0][1]],
+                'image': IMAGE,
+                'name': f'Новый рецепт {i}',
+                'text': 'Описание',
+                'cooking_time': 10,
+            }
+
+        recipe = client.post('/api/recipes/', recipe_data(0), format='json')
+        recipe_url = f'/api/recipes/{recipe.data["id"]}/'
+        benchmarks = {
+            'recipes_list': lambda i: client.get('/api/recipes/'),
+            'recipes_list_by_tag': lambda i: client.get(
+                f'/api/recipes/?tags={tag_slug}'),
+            'recipes_list_by_author': lambda i: client.get(
+                f'/api/recipes/?author={author}'),
+            'recipes_list_favorited': lambda i: client.get(
+                '/api/recipes/?is_favorited=1'),
+            'recipe_create': lambda i: client.post(
+                '/api/recipes/', recipe_data(i), format='json'),
+            'recipe_update': lambda i: client.patch(
+                recipe_url, recipe_data(i), format='json'),
+            'subscriptions': lambda i: client.get(
+                '/api/users/subscriptions/?recipes_limit=3'),
+            'ingredient_search': lambda i: client.get(
+                f'/api/ingredients/search/?name={i % 10}'),
+            'download_shopping_cart_cached': lambda i: client.get(
+                '/api/recipes/download_shopping_cart/'),
+            'download_shopping_cart_txt': lambda i: client.get(
+                '/api/recipes/download_shopping_cart/?format=txt'),
+        }
+        results = {name: self.measure(options, request)
+                   for name, request in benchmarks.items()}
+        results['download_shopping_cart'] = self.measure(
+            options,
+            lambda i: client.get('/api/recipes/download_shopping_cart/'),
+            before=lambda: cache.delete(get_content_key(
+                get_shopping_list_digest(user.buyer))))
+        results.update(self.measure_connections(
+            options, lambda i: client.get(recipe_url)))
+        config = {key: options[key] for key in (
+            'users', 'recipes', 'tags', 'ingredients',
+            'ingredients_per_recipe', 'follows', 'favorites', 'cart',
+            'iterations', 'warmup', 'seed')}
+        config['database'] = connection.vendor
+        config['cache_backend'] = settings.CACHES['default']['BACKEND']
+        config['token_cache'] = is_cache_shared()
+        return {'config': config, 'results': results}
@@ -2,8 +2,12 @@ from rest_framework.serializers import ModelSerializer
 
 from recipes.models import Recipe
 
+from .fields import ImageVariantsField
+
 
 class ShortRecipeSerializer(ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',)
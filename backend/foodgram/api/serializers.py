@@ -1,11 +1,14 @@
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
 
-from recipes.models import (Favorite, Ingredient, IngredientsAmount, Recipe,
-                            ShoppingCart, Tag)
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem, Tag)
 from users.serializers import UserViewSerializer
 
+from .fields import HashedBase64ImageField, ImageVariantsField
+
+BATCH_MAX_SIZE = 100
+
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,25 +24,24 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class RecipeIngredientGETSerializer(serializers.ModelSerializer):
 
-    id = serializers.IntegerField(source='ingredients.id')
-    name = serializers.CharField(source='ingredients.name')
+    id = serializers.IntegerField(source='ingredient.id')
+    name = serializers.CharField(source='ingredient.name')
     measurement_unit = serializers.CharField(
-        source='ingredients.measurement_unit')
+        source='ingredient.measurement_unit')
 
     class Meta:
-        model = IngredientsAmount
+        model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
 class RecipeIngredientPOSTSerializer(serializers.ModelSerializer):
 
+    id = serializers.IntegerField()
+
     class Meta:
-        model = IngredientsAmount
+        model = RecipeIngredient
         fields = ('id', 'amount')
         extra_kwargs = {
-            'id': {'read_only': False,
-                   'error_messages': {
-                       'does_not_exist': 'Ингредиента не существует!'}},
             'amount': {'error_messages': {
                        'min_value': 'Слишком малое количество ингредиента!'}}
         }
@@ -50,18 +52,22 @@ class RecipeGETSerializer(serializers.ModelSerializer):
 
     tags = TagSerializer(many=True)
     author = UserViewSerializer()
-    ingredients = RecipeIngredientGETSerializer(many=True)
+    ingredients = RecipeIngredientGETSerializer(
+        many=True, source='recipe_ingredients')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_variants', 'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
         """Получение поля is_favorited"""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         user = request.user
         if user.is_anonymous:
@@ -71,6 +77,8 @@ class RecipeGETSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Получение поля is_in_shopping_cart"""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         user = request.user
         if user.is_anonymous:
@@ -86,7 +94,7 @@ class RecipePOSTSerializer(serializers.ModelSerializer):
     tags = serializers.ListField(child=serializers.SlugRelatedField(
         slug_field='id',
         queryset=Tag.objects.all()))
-    image = Base64ImageField()
+    image = HashedBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -118,6 +126,11 @@ class RecipePOSTSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты в рецепте не могут повторяться!')
 
+        if len(Ingredient.objects.in_bulk(id_ingredients)) < len(
+                id_ingredients):
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиента не существует!'})
+
         if attrs['cooking_time'] == 0:
             raise serializers.ValidationError(
                 {'cooking_time': 'Слишком малое время приготовления!'})
@@ -128,22 +141,54 @@ class RecipePOSTSerializer(serializers.ModelSerializer):
 
         return attrs
 
-    def add_ingredients_tags_fields(self, instance, validated_data):
+    def add_ingredients_tags_fields(self, instance, validated_data,
+                                    replace=False):
         """Добавить ингредиенты и теги в рецепт"""
 
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
 
-        for ingredient in ingredients:
-            count_of_ingredient, _ = IngredientsAmount.objects.get_or_create(
-                ingredients=get_object_or_404(Ingredient, pk=ingredient['id']),
-                amount=ingredient['amount'])
-            instance.ingredients.add(count_of_ingredient)
-
-        for tag in tags:
-            instance.tags.add(tag)
+        self.set_ingredients(instance, ingredients, replace)
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=instance, tag=tag)
+            for tag in set(tags))
         return instance
 
+    def set_ingredients(self, instance, ingredients, replace=False):
+        """Записать ингредиенты рецепта, изменив только отличающиеся строки"""
+        amounts = {ingredient['id']: ingredient['amount']
+                   for ingredient in ingredients}
+        current = {}
+        if replace:
+            current = {row.ingredient_id: row for row in
+                       RecipeIngredient.objects.filter(recipe=instance)}
+        deltas = {ingredient_id: -row.amount
+                  for ingredient_id, row in current.items()}
+        for ingredient_id, amount in amounts.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) + amount
+        stale = [row.pk for ingredient_id, row in current.items()
+                 if ingredient_id not in amounts]
+        if stale:
+            RecipeIngredient.objects.filter(pk__in=stale).delete()
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=instance, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current)
+        if replace:
+            ShoppingListItem.objects.change_recipe(
+                instance.pk, {ingredient_id: delta for ingredient_id, delta
+                              in deltas.items() if delta})
+
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта"""
 
@@ -153,8 +198,20 @@ class RecipePOSTSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         return self.add_ingredients_tags_fields(recipe, other_fields)
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.ingredients.clear()
         instance.tags.clear()
-        instance = self.add_ingredients_tags_fields(instance, validated_data)
+        instance = self.add_ingredients_tags_fields(
+            instance, validated_data, replace=True)
         return super().update(instance, validated_data)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций"""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=BATCH_MAX_SIZE)
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
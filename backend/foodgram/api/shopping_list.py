@@ -0,0 +1,264 @@
+import csv
+import hashlib
+import json
+import threading
+from collections import namedtuple
+from tempfile import SpooledTemporaryFile
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.utils.mediatypes import (media_type_matches,
+                                             order_by_precedence)
+
+from recipes.models import ShoppingCart, ShoppingListItem
+
+NAME = 'ingredient__name'
+MEASUREMENT_UNIT = 'ingredient__measurement_unit'
+FILENAME_PREFIX = 'shopping_list'
+FILENAME = f'{FILENAME_PREFIX}.pdf'
+DEFAULT_FORMAT = 'pdf'
+FORMAT_PARAM = 'format'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+
+FONT_NAME = 'Arial'
+FONT_FILE = settings.BASE_DIR / 'fonts' / 'arialbi.ttf'
+
+TITLE = 'Список покупок'
+TITLE_FONT_SIZE = 24
+TITLE_POSITION = (200, 800)
+LINE_FONT_SIZE = 16
+LINE_HEIGHT = 25
+LEFT_MARGIN = 75
+FIRST_PAGE_TOP = 750
+PAGE_TOP = 800
+BOTTOM_MARGIN = 50
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
+
+CACHE_PREFIX = 'shopping_list'
+CACHE_TIMEOUT = 60 * 60
+
+_fonts_lock = threading.Lock()
+
+ShoppingListFormat = namedtuple(
+    'ShoppingListFormat',
+    ('name', 'media_type', 'content_type', 'filename', 'render', 'cached'))
+
+formats = {}
+
+
+def shopping_list_format(name, media_type, charset=None, cached=False):
+    """Зарегистрировать функцию вывода списка покупок в формате name.
+
+    Функция получает содержимое списка из get_shopping_list_content и
+    возвращает итератор по частям файла. Результат форматов с cached=True
+    сохраняется в кэш целиком.
+    """
+    content_type = media_type
+    if charset:
+        content_type = f'{media_type}; charset={charset}'
+
+    def decorator(func):
+        formats[name] = ShoppingListFormat(
+            name, media_type, content_type, f'{FILENAME_PREFIX}.{name}',
+            func, cached)
+        return func
+    return decorator
+
+
+def select_format(request):
+    """Выбрать формат списка покупок по параметру format или Accept.
+
+    Из одинаково конкретных типов в Accept берется указанный раньше.
+    Неизвестное значение параметра дает None, а заголовок без подходящих
+    типов - формат по умолчанию.
+    """
+    name = request.query_params.get(FORMAT_PARAM)
+    if name:
+        return formats.get(name)
+    accepts = [media_type.strip() for media_type
+               in request.headers.get('Accept', '').split(',')
+               if media_type.strip()]
+    for media_type_set in order_by_precedence(accepts):
+        for media_type in sorted(media_type_set, key=accepts.index):
+            for export in formats.values():
+                if media_type_matches(export.media_type, media_type):
+                    return export
+    return formats[DEFAULT_FORMAT]
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """Ответы API выводятся основным рендерером.
+
+    Параметр format и заголовок Accept выбирают формат файла списка
+    покупок (select_format), а не рендерер DRF.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def get_shopping_list_content(shopping_cart):
+    """Суммарное количество каждого ингредиента в списке покупок"""
+    ingredients = (
+        ShoppingListItem.objects.filter(user=shopping_cart.user_id)
+        .order_by(NAME)
+        .values(NAME, MEASUREMENT_UNIT)
+        .annotate(amount=Sum('total'))
+    )
+    content = {}
+    for item in ingredients:
+        content[item[NAME]] = {
+            'measurement_unit': item[MEASUREMENT_UNIT],
+            'amount': item['amount']
+        }
+    return content
+
+
+def register_fonts():
+    """Зарегистрировать шрифт один раз за время жизни процесса"""
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return
+    with _fonts_lock:
+        if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(FONT_NAME, str(FONT_FILE)))
+
+
+def iter_lines(content):
+    """Строки списка покупок для текстовых форматов"""
+    for i, (name, data) in enumerate(content.items(), 1):
+        yield f'{i}. {name} - {data["amount"]} {data["measurement_unit"]}'
+
+
+def draw_shopping_list(page, content):
+    """Вывести список покупок на страницы документа"""
+    page.setFont(FONT_NAME, size=TITLE_FONT_SIZE)
+    page.drawString(*TITLE_POSITION, TITLE)
+    page.setFont(FONT_NAME, size=LINE_FONT_SIZE)
+    height = FIRST_PAGE_TOP
+    for line in iter_lines(content):
+        if height < BOTTOM_MARGIN:
+            page.showPage()
+            page.setFont(FONT_NAME, size=LINE_FONT_SIZE)
+            height = PAGE_TOP
+        page.drawString(LEFT_MARGIN, height, line)
+        height -= LINE_HEIGHT
+    page.showPage()
+
+
+def iter_file(file, chunk_size=CHUNK_SIZE):
+    """Прочитать файл частями и закрыть его"""
+    with file:
+        file.seek(0)
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            yield chunk
+
+
+@shopping_list_format('pdf', 'application/pdf', cached=True)
+def render_shopping_list(content):
+    """Сформировать PDF со списком покупок.
+
+    Документ собирается во временном файле, который переносится на диск
+    при превышении SPOOL_MAX_SIZE, и возвращается итератором по частям.
+    """
+    register_fonts()
+    buffer = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    page = canvas.Canvas(buffer, pagesize=A4)
+    draw_shopping_list(page, content)
+    page.save()
+    return iter_file(buffer)
+
+
+@shopping_list_format('txt', 'text/plain', charset='utf-8')
+def render_text(content):
+    """Список покупок текстом, по строке на ингредиент"""
+    yield f'{TITLE}\n\n'.encode()
+    for line in iter_lines(content):
+        yield f'{line}\n'.encode()
+
+
+class Echo:
+    """Файлоподобный объект, который возвращает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+@shopping_list_format('csv', 'text/csv', charset='utf-8')
+def render_csv(content):
+    """Список покупок в CSV с заголовком"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER).encode()
+    for name, data in content.items():
+        yield writer.writerow(
+            (name, data['amount'], data['measurement_unit'])).encode()
+
+
+@shopping_list_format('json', 'application/json')
+def render_json(content):
+    """Список покупок JSON-массивом, по элементу на ингредиент"""
+    yield b'['
+    for i, (name, data) in enumerate(content.items()):
+        item = json.dumps({'name': name, **data}, ensure_ascii=False)
+        yield f'{"," if i else ""}{item}'.encode()
+    yield b']'
+
+
+def get_revision_key(recipe_id):
+    return f'{CACHE_PREFIX}:recipe:{recipe_id}'
+
+
+def get_content_key(digest, format_name=DEFAULT_FORMAT):
+    return f'{CACHE_PREFIX}:{format_name}:{digest}'
+
+
+def invalidate_recipes(*recipe_ids):
+    """Сбросить закэшированные списки покупок, содержащие рецепты"""
+    cache.set_many({get_revision_key(recipe_id): uuid4().hex
+                    for recipe_id in recipe_ids}, timeout=None)
+
+
+def get_shopping_list_digest(shopping_cart):
+    """Получить хеш набора рецептов в списке покупок.
+
+    В хеш входят ревизии рецептов, поэтому изменение состава списка
+    или редактирование рецепта из него дает новый хеш.
+    """
+    recipe_ids = (
+        ShoppingCart.recipe.through.objects
+        .filter(shoppingcart=shopping_cart)
+        .order_by('recipe_id')
+        .values_list('recipe_id', flat=True)
+    )
+    keys = [get_revision_key(recipe_id) for recipe_id in recipe_ids]
+    revisions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in revisions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        revisions.update(missing)
+    digest = hashlib.sha256()
+    for key in keys:
+        digest.update(f'{key}={revisions[key]};'.encode())
+    return digest.hexdigest()
+
+
+def get_cached_shopping_list(digest, format_name=DEFAULT_FORMAT):
+    return cache.get(get_content_key(digest, format_name))
+
+
+def cache_shopping_list(digest, chunks, format_name=DEFAULT_FORMAT):
+    """Отдать части документа и сохранить его в кэш целиком"""
+    content = []
+    for chunk in chunks:
+        content.append(chunk)
+        yield chunk
+    cache.set(get_content_key(digest, format_name), b''.join(content),
+              CACHE_TIMEOUT)
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow
+
+from .catalog import ingredients_catalog, tags_catalog
+from .feed import invalidate_feed
+from .shopping_list import invalidate_recipes
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags_catalog(**kwargs):
+    tags_catalog.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients_catalog(**kwargs):
+    ingredients_catalog.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Follow)
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_user_feed(instance, **kwargs):
+    invalidate_feed(instance.user_id)
+
+
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def invalidate_shopping_cart_feed(instance, action, reverse, pk_set,
+                                  **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_feed(instance.user_id)
+    elif pk_set:
+        invalidate_feed(*ShoppingCart.objects.filter(
+            pk__in=pk_set).values_list('user_id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_shopping_lists(sender, instance, **kwargs):
+    """Сбросить списки покупок с рецептом после сохранения транзакции.
+
+    Ингредиенты из API пишутся пакетно, без сигналов, но вместе с ними
+    всегда сохраняется сам рецепт.
+    """
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    transaction.on_commit(lambda: invalidate_recipes(recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_shopping_lists(instance, created, **kwargs):
+    """Название и единица измерения ингредиента есть в файле списка"""
+    if created:
+        return
+    transaction.on_commit(lambda: invalidate_recipes(*(
+        RecipeIngredient.objects
+        .filter(ingredient=instance, recipe__purchase__isnull=False)
+        .values_list('recipe_id', flat=True).distinct())))
@@ -0,0 +1,19 @@
+from jobs.registry import task
+
+from .shopping_list import (FILENAME, cache_shopping_list,
+                            get_shopping_list_content,
+                            get_shopping_list_digest, render_shopping_list)
+
+RENDER_SHOPPING_LIST_TASK = 'api.render_shopping_list'
+
+
+@task(RENDER_SHOPPING_LIST_TASK)
+def render_shopping_list_task(job):
+    """Сформировать PDF со списком покупок пользователя задачи"""
+    shopping_cart = job.user.buyer
+    digest = get_shopping_list_digest(shopping_cart)
+    content = get_shopping_list_content(shopping_cart)
+    job.output = b''.join(
+        cache_shopping_list(digest, render_shopping_list(content)))
+    job.output_content_type = 'application/pdf'
+    return {'filename': FILENAME, 'digest': digest}
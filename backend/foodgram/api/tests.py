@@ -0,0 +1,422 @@
+import tempfile
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.authentication import token_cache
+from users.models import Follow, User
+
+from .filters import RecipeFilter
+from .serializers import BATCH_MAX_SIZE
+from .management.commands.benchmark_api import IMAGE
+
+RECIPES_URL = '/api/recipes/'
+
+
+class RecipeListContractTest(TestCase):
+    """Быстрый список рецептов совпадает с ответом RecipeGETSerializer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com',
+            first_name='Читатель', last_name='Рецептов')
+        authors = [
+            User.objects.create(
+                username=f'author{i}', email=f'author{i}@example.com',
+                first_name='Автор', last_name=str(i))
+            for i in range(2)
+        ]
+        tags = [Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                                   slug=f'tag{i}')
+                for i in range(3)]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(3)
+        ]
+        recipes = [
+            Recipe.objects.create(
+                author=authors[i % 2], name=f'Рецепт {i}',
+                image=f'recipes/images/recipe{i}.png', text='Описание',
+                cooking_time=10 + i)
+            for i in range(3)
+        ]
+        Recipe.objects.filter(pk=recipes[0].pk).update(
+            image_variants_for=recipes[0].image.name)
+        recipes[0].tags.set(tags[:2])
+        recipes[2].tags.set(tags[1:])
+        for i, recipe in enumerate(recipes):
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=i * 10 + j + 1)
+                for j, ingredient in enumerate(ingredients[:i + 1]))
+        Follow.objects.create(user=cls.user, author=authors[0])
+        Favorite.objects.create(user=cls.user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=cls.user).recipe.add(recipes[1])
+
+    def assert_list_matches_detail(self, client):
+        response = client.get(RECIPES_URL, {'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), Recipe.objects.count())
+        for recipe in results:
+            detail = client.get(f'{RECIPES_URL}{recipe["id"]}/')
+            self.assertEqual(detail.status_code, 200)
+            self.assertEqual(recipe, detail.json())
+        return results
+
+    def test_anonymous(self):
+        results = self.assert_list_matches_detail(APIClient())
+        self.assertFalse(any(recipe['is_favorited']
+                             or recipe['is_in_shopping_cart']
+                             or recipe['author']['is_subscribed']
+                             for recipe in results))
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        results = self.assert_list_matches_detail(client)
+        self.assertEqual(
+            sum(recipe['is_favorited'] for recipe in results), 1)
+        self.assertEqual(
+            sum(recipe['is_in_shopping_cart'] for recipe in results), 1)
+        self.assertTrue(any(recipe['author']['is_subscribed']
+                            for recipe in results))
+
+    def test_images_and_tags(self):
+        results = self.assert_list_matches_detail(APIClient())
+        images = {recipe['image'] for recipe in results}
+        self.assertTrue(all(image.startswith('http://testserver/')
+                            for image in images))
+        self.assertTrue(any(
+            set(recipe['image_variants'].values()) != {recipe['image']}
+            for recipe in results))
+        self.assertTrue(any(len(recipe['tags']) > 1 for recipe in results))
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'планы запросов проверяются только в PostgreSQL')
+class RecipeFilterIndexTest(TestCase):
+    """Фильтры списка рецептов используют индексы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com')
+        cls.author = User.objects.create(
+            username='author', email='author@example.com')
+        cls.tags = [Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                                       slug=f'tag{i}')
+                    for i in range(2)]
+        for i in range(10):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}', image='recipe.png',
+                text='Описание', cooking_time=1)
+            recipe.tags.set(cls.tags[:i % 2 + 1])
+            if i % 3 == 0:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        # На нескольких строках последовательное чтение дешевле любого
+        # индекса, поэтому планировщику оно запрещается.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def get_plan(self, query_string):
+        request = RequestFactory().get(RECIPES_URL)
+        request.user = self.user
+        filterset = RecipeFilter(QueryDict(query_string),
+                                 queryset=Recipe.objects.all(),
+                                 request=request)
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        return filterset.qs.explain()
+
+    def assert_uses_index(self, plan, model):
+        """В плане нет последовательного чтения и есть индекс таблицы"""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table)
+        self.assertNotIn('Seq Scan', plan)
+        self.assertTrue(
+            any(name in plan for name, constraint in constraints.items()
+                if constraint['index'] or constraint['unique']),
+            plan)
+
+    def test_tags_filter_uses_recipe_tag_index(self):
+        plan = self.get_plan('tags=tag0&tags=tag1')
+        self.assert_uses_index(plan, Recipe.tags.through)
+
+    def test_author_filter_uses_author_index(self):
+        plan = self.get_plan(f'author={self.author.pk}')
+        self.assertIn('recipe_author_idx', plan)
+
+    def test_is_favorited_filter_uses_index(self):
+        plan = self.get_plan('is_favorited=1')
+        self.assert_uses_index(plan, Favorite)
+
+
+class BatchEndpointTest(TestCase):
+    """Пакетное изменение избранного и списка покупок"""
+
+    FAVORITE_URL = f'{RECIPES_URL}favorite/'
+    SHOPPING_CART_URL = f'{RECIPES_URL}shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com')
+        cls.other = User.objects.create(
+            username='other', email='other@example.com')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.other, name=f'Рецепт {i}', image='recipe.png',
+                text='Описание', cooking_time=1)
+            for i in range(3)
+        ]
+        cls.ids = [recipe.pk for recipe in cls.recipes]
+        cls.missing_id = max(cls.ids) + 1
+        Favorite.objects.create(user=cls.other, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.other).recipe.add(
+            cls.recipes[0])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request(self, method, url, recipe_ids):
+        response = getattr(self.client, method)(
+            url, {'recipes': recipe_ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return {result['id']: result['status']
+                for result in response.json()['results']}
+
+    def get_counters(self, field):
+        return list(Recipe.objects.filter(pk__in=self.ids).order_by('pk')
+                    .values_list(field, flat=True))
+
+    def assert_batch(self, url, field, added):
+        first, second, third = self.ids
+        self.assertEqual(
+            self.request('post', url, [first, second, self.missing_id]),
+            {first: 'added', second: 'added',
+             self.missing_id: 'not_found'})
+        self.assertEqual(
+            self.request('post', url, [first, third, first]),
+            {first: 'exists', third: 'added'})
+        self.assertEqual(self.get_counters(field), [2, 1, 1])
+        self.assertEqual(set(added()), set(self.ids))
+        self.assertEqual(
+            self.request('delete', url, [second, third, self.missing_id]),
+            {second: 'removed', third: 'removed',
+             self.missing_id: 'not_found'})
+        self.assertEqual(
+            self.request('delete', url, [second, third]),
+            {second: 'missing', third: 'missing'})
+        self.assertEqual(self.get_counters(field), [2, 0, 0])
+        self.assertEqual(list(added()), [first])
+
+    def test_favorite_batch(self):
+        self.assert_batch(
+            self.FAVORITE_URL, 'favorites_count',
+            lambda: Favorite.objects.filter(user=self.user)
+            .values_list('recipe_id', flat=True))
+
+    def test_shopping_cart_batch(self):
+        self.assert_batch(
+            self.SHOPPING_CART_URL, 'in_carts_count',
+            lambda: ShoppingCart.objects.get(user=self.user).recipe
+            .values_list('pk', flat=True))
+
+    def test_single_and_batch_counters_agree(self):
+        first = self.ids[0]
+        response = self.client.post(f'{RECIPES_URL}{first}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.request('post', self.FAVORITE_URL, [first]),
+                         {first: 'exists'})
+        self.assertEqual(self.get_counters('favorites_count')[0], 2)
+        self.request('delete', self.FAVORITE_URL, [first])
+        self.assertEqual(self.get_counters('favorites_count')[0], 1)
+
+    def test_batch_size_limit(self):
+        recipe_ids = list(range(1, BATCH_MAX_SIZE + 2))
+        for url in (self.FAVORITE_URL, self.SHOPPING_CART_URL):
+            with self.subTest(url=url):
+                response = self.client.post(
+                    url, {'recipes': recipe_ids}, format='json')
+                self.assertEqual(response.status_code, 400)
+                results = self.request('post', url,
+                                       recipe_ids[:BATCH_MAX_SIZE])
+                self.assertEqual(len(results), BATCH_MAX_SIZE)
+                self.assertEqual(
+                    sorted(pk for pk, status in results.items()
+                           if status == 'added'),
+                    self.ids)
+
+    def test_requires_authentication(self):
+        response = APIClient().post(self.FAVORITE_URL,
+                                    {'recipes': self.ids}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class RecipeImageTest(TestCase):
+    """Имя файла картинки рецепта определяется ее содержимым"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.media_root = Path(media_root.name)
+        self.author = User.objects.create(
+            username='author', email='author@example.com')
+        self.tag = Tag.objects.create(name='Тег', color='#000000',
+                                      slug='tag')
+        self.ingredient = Ingredient.objects.create(name='Ингредиент',
+                                                    measurement_unit='г')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def get_recipe_data(self, name):
+        return {
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 1}],
+            'tags': [self.tag.pk],
+            'image': IMAGE,
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+
+    def create_recipe(self, name):
+        response = self.client.post(RECIPES_URL, self.get_recipe_data(name),
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        return Recipe.objects.get(pk=response.json()['id'])
+
+    def test_same_image_reuses_file(self):
+        first = self.create_recipe('Первый')
+        second = self.create_recipe('Второй')
+        self.assertEqual(first.image.name, second.image.name)
+        response = self.client.put(f'{RECIPES_URL}{first.pk}/',
+                                   self.get_recipe_data('Первый'),
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        first.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        images = [path.name for path in
+                  (self.media_root / 'recipes' / 'images').iterdir()]
+        self.assertEqual(images, [Path(first.image.name).name])
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_QUERY_BUDGETS_STRICT=True)
+@patch('users.authentication.is_cache_shared', return_value=True)
+class QueryBudgetTest(TransactionTestCase):
+    """Основные эндпоинты укладываются в PROFILING_QUERY_BUDGETS.
+
+    Кэш в памяти процесса считается общим, как Redis, а перед каждым
+    запросом очищается. Транзакции не оборачиваются в тест, поэтому
+    запросы к БД совпадают с работой сервера.
+    """
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        # Рецепты создаются и в setUp, а потоки с копиями картинок
+        # конкурировали бы с тестом за БД.
+        variants = patch('recipes.signals.schedule_variants')
+        variants.start()
+        self.addCleanup(variants.stop)
+        self.user = User.objects.create(
+            username='reader', email='reader@example.com')
+        self.author = User.objects.create(
+            username='author', email='author@example.com')
+        Follow.objects.create(user=self.user, author=self.author)
+        self.tag = Tag.objects.create(name='Тег', color='#000000',
+                                      slug='tag')
+        self.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(3)
+        ]
+        self.client = self.get_client(self.user)
+        self.author_client = self.get_client(self.author)
+        self.recipe_ids = [self.create_recipe(i).json()['id']
+                           for i in range(3)]
+        self.client.post(f'{RECIPES_URL}shopping_cart/',
+                         {'recipes': self.recipe_ids[:2]}, format='json')
+
+    def get_client(self, user):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}')
+        return client
+
+    def get_recipe_data(self, i):
+        return {
+            'ingredients': [{'id': ingredient.pk, 'amount': i + 1}
+                            for ingredient in self.ingredients],
+            'tags': [self.tag.pk],
+            'image': IMAGE,
+            'name': f'Рецепт {i}',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+
+    def create_recipe(self, i):
+        return self.author_client.post(
+            RECIPES_URL, self.get_recipe_data(i), format='json')
+
+    def assert_within_budget(self, request, status_code=200):
+        cache.clear()
+        token_cache.clear()
+        response = request()
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status_code)
+        self.assertIn('Server-Timing', response)
+
+    def test_read_endpoints(self, *mocks):
+        recipe_url = f'{RECIPES_URL}{self.recipe_ids[0]}/'
+        requests = {
+            'list_anonymous': lambda: APIClient().get(RECIPES_URL),
+            'list': lambda: self.client.get(RECIPES_URL),
+            'retrieve': lambda: self.client.get(recipe_url),
+            'feed': lambda: self.client.get(f'{RECIPES_URL}feed/'),
+            'subscriptions': lambda: self.client.get(
+                '/api/users/subscriptions/'),
+            'download_shopping_cart': lambda: self.client.get(
+                f'{RECIPES_URL}download_shopping_cart/'),
+        }
+        for name, request in requests.items():
+            with self.subTest(name):
+                self.assert_within_budget(request)
+
+    def test_recipe_writes(self, *mocks):
+        recipe_url = f'{RECIPES_URL}{self.recipe_ids[0]}/'
+        self.assert_within_budget(lambda: self.create_recipe(5), 201)
+        self.assert_within_budget(lambda: self.author_client.put(
+            recipe_url, self.get_recipe_data(6), format='json'))
+        self.assert_within_budget(lambda: self.author_client.patch(
+            recipe_url, self.get_recipe_data(7), format='json'))
+
+    def test_batch_endpoints(self, *mocks):
+        for url in (f'{RECIPES_URL}favorite/',
+                    f'{RECIPES_URL}shopping_cart/'):
+            for method in (self.client.post, self.client.delete):
+                with self.subTest(url=url, method=method.__name__):
+                    self.assert_within_budget(lambda: method(
+                        url, {'recipes': self.recipe_ids}, format='json'))
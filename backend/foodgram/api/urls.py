@@ -1,12 +1,13 @@
 from django.urls import include, path
-from rest_framework.routers import DefaultRouter
+
+from foodgram.threadpool import ThreadPoolRouter
 
 from .views import (IngredientViewSet, RecipeViewSet, ShoppingCartViewSet,
                     TagViewSet)
 
 app_name = 'api'
 
-router_v1 = DefaultRouter()
+router_v1 = ThreadPoolRouter()
 
 router_v1.register('tags', TagViewSet, basename='tags')
 router_v1.register('ingredients', IngredientViewSet, basename='ingredients')
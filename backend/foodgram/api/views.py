@@ -1,35 +1,53 @@
+from functools import partial
+
 from django.db import DatabaseError
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import (HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
 from django_filters.rest_framework.backends import DjangoFilterBackend
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 
-from foodgram.pagination import LimitPageNumberPagination
+from foodgram.pagination import (LimitCursorPagination,
+                                 LimitPageNumberPagination)
+from jobs.models import Job
+from jobs.views import job_accepted
 from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 
+from .catalog import CatalogListMixin, ingredients_catalog, tags_catalog
+from .fast_serializers import RecipeListSerializer, get_value_fields
+from .feed import (cache_feed, get_cached_feed, get_feed_cache_key,
+                   invalidate_feed)
 from .filters import IngredientNameFilter, RecipeFilter
 from .nested import ShortRecipeSerializer
 from .permissions import IsAdmin, IsAuthorOrAdminOrReadOnly
 from .serializers import (IngredientSerializer, RecipeGETSerializer,
-                          RecipePOSTSerializer, TagSerializer)
+                          RecipeIdsSerializer, RecipePOSTSerializer,
+                          TagSerializer)
+from .shopping_list import (ShoppingListNegotiation, cache_shopping_list,
+                            formats, get_cached_shopping_list,
+                            get_shopping_list_content,
+                            get_shopping_list_digest, select_format)
+from .tasks import RENDER_SHOPPING_LIST_TASK
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CatalogListMixin, viewsets.ModelViewSet):
     """Отображение тега/списка тегов"""
+    catalog = tags_catalog
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdmin,)
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CatalogListMixin, viewsets.ModelViewSet):
     """Отображение ингредиента/списка ингредиентов"""
+    catalog = ingredients_catalog
+    SEARCH_LIMIT = 10
+    SEARCH_MAX_LIMIT = 50
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdmin,)
@@ -37,6 +55,25 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientNameFilter
 
+    def get_search_limit(self, request):
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            return self.SEARCH_LIMIT
+        return min(max(limit, 1), self.SEARCH_MAX_LIMIT)
+
+    @action(detail=False, methods=('get',))
+    def search(self, request):
+        """Поиск ингредиентов для автодополнения"""
+        name = request.query_params.get('name', '').strip()
+        if not name:
+            return Response([], status=status.HTTP_200_OK)
+        queryset = Ingredient.objects.search(name).only(
+            'id', 'name', 'measurement_unit')
+        serializer = self.get_serializer(
+            queryset[:self.get_search_limit(request)], many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для работы с рецептами"""
@@ -46,6 +83,50 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    thread_pool_actions = ('favorite', 'shopping_cart', 'favorite_batch',
+                           'shopping_cart_batch')
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.for_user(self.request.user)
+        return super().get_queryset()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(
+            Recipe.objects.with_user_flags(request.user))
+        queryset = queryset.values(*get_value_fields(queryset))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = RecipeListSerializer(page, request)
+            return self.get_paginated_response(serializer.data)
+        serializer = RecipeListSerializer(queryset, request)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAuthenticated,),
+            pagination_class=LimitCursorPagination)
+    def feed(self, request):
+        """Рецепты авторов из подписок с пагинацией по ключу"""
+        cache_key = get_feed_cache_key(
+            request.user.pk, request.build_absolute_uri())
+        data = get_cached_feed(cache_key)
+        if data is None:
+            queryset = self.filter_queryset(
+                Recipe.objects.feed(request.user)
+                .with_user_flags(request.user))
+            queryset = queryset.values(*get_value_fields(queryset))
+            page = self.paginate_queryset(queryset)
+            data = self.get_paginated_response(
+                RecipeListSerializer(page, request).data).data
+            cache_feed(cache_key, data)
+        return Response(data)
+
+    def get_read_serializer(self, instance):
+        """Сериализовать рецепт с аннотациями для ответа"""
+        instance = Recipe.objects.for_user(self.request.user).get(
+            pk=instance.pk)
+        return RecipeGETSerializer(
+            instance=instance, context={'request': self.request})
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -60,10 +141,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
-        serializer = RecipeGETSerializer(
-            instance=serializer.instance,
-            context={'request': self.request}
-        )
+        serializer = self.get_read_serializer(serializer.instance)
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
@@ -76,9 +154,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        serializer = RecipeGETSerializer(
-            instance=serializer.instance,
-            context={'request': self.request})
+        serializer = self.get_read_serializer(serializer.instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def create_favorite(self, request, recipe):
@@ -137,59 +213,109 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.create_shopping_cart(request, recipe, shopping_cart)
         return self.delete_shopping_cart(request, recipe, shopping_cart)
 
+    def apply_batch(self, request, add, remove):
+        """Добавить (POST) или удалить (DELETE) рецепты из списка recipes.
+
+        Рецепты проверяются одним запросом, а в ответе для каждого id
+        указывается статус: added, exists, removed, missing или not_found.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        found = set(Recipe.objects.filter(pk__in=recipe_ids)
+                    .values_list('pk', flat=True))
+        valid_ids = [pk for pk in recipe_ids if pk in found]
+        if request.method == 'POST':
+            changed, statuses = set(add(valid_ids)), ('exists', 'added')
+        else:
+            changed, statuses = set(remove(valid_ids)), ('missing', 'removed')
+        return Response({'results': [
+            {'id': pk,
+             'status': statuses[pk in changed] if pk in found
+             else 'not_found'}
+            for pk in recipe_ids
+        ]})
+
+    @action(detail=False, methods=('post', 'delete',),
+            permission_classes=(IsAuthenticated,),
+            url_path='favorite', url_name='favorite-batch')
+    def favorite_batch(self, request):
+        """Пакетное изменение избранного"""
+        response = self.apply_batch(
+            request, partial(Favorite.objects.add_recipes, request.user),
+            partial(Favorite.objects.remove_recipes, request.user))
+        invalidate_feed(request.user.pk)
+        return response
+
+    @action(detail=False, methods=('post', 'delete',),
+            permission_classes=(IsAuthenticated,),
+            url_path='shopping_cart', url_name='shopping-cart-batch')
+    def shopping_cart_batch(self, request):
+        """Пакетное изменение списка покупок"""
+        shopping_cart = (
+            ShoppingCart.objects.get_or_create(user=request.user)[0])
+        return self.apply_batch(request, shopping_cart.add_recipes,
+                                shopping_cart.remove_recipes)
+
 
 class ShoppingCartViewSet(viewsets.GenericViewSet):
-    NAME = 'ingredients__ingredients__name'
-    MEASUREMENT_UNIT = 'ingredients__ingredients__measurement_unit'
     queryset = ShoppingCart.objects.all()
     permission_classes = (IsAuthenticated,)
     serializer_class = ShortRecipeSerializer
+    thread_pool_actions = ('download_shopping_cart',)
 
-    def create_shopping_cart_content(self, request):
-        recipes = (
-            request.user.buyer.recipe.prefetch_related('ingredients')
-        )
-        return (recipes.order_by(self.NAME)
-                .values(self.NAME, self.MEASUREMENT_UNIT)
-                .annotate(total=Sum('ingredients__amount')))
-
-    def create_ingredients_content(self, ingredients):
-        content = {}
-        for item in ingredients:
-            print(item)
-            name = item[self.NAME]
-            content[name] = {
-                'measurement_unit': item[self.MEASUREMENT_UNIT],
-                'amount': item['total']
-            }
-        return content
+    def render_shopping_cart(self, shopping_cart, digest, export):
+        """Отрисовать список покупок или взять его из кэша"""
+        if export.cached:
+            content = get_cached_shopping_list(digest, export.name)
+            if content is not None:
+                return HttpResponse(content, content_type=export.content_type)
+        chunks = export.render(get_shopping_list_content(shopping_cart))
+        if export.cached:
+            chunks = cache_shopping_list(digest, chunks, export.name)
+        return StreamingHttpResponse(chunks, content_type=export.content_type)
+
+    def is_background(self, request, export, digest):
+        """Формировать ли список фоновой задачей"""
+        return (request.query_params.get('async') in ('1', 'true')
+                and export.cached
+                and get_cached_shopping_list(digest, export.name) is None)
 
     @action(detail=False, methods=['GET'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            content_negotiation_class=ShoppingListNegotiation)
     def download_shopping_cart(self, request):
-        """Формирование списка покупок и его печать в файл"""
+        """Формирование списка покупок и его печать в файл.
+
+        Формат выбирается параметром format (pdf, txt, csv, json) или
+        заголовком Accept, по умолчанию - PDF. С параметром async=1
+        несохраненный в кэше PDF формируется фоновой задачей, а в ответе
+        202 возвращается ссылка на нее.
+        """
+        export = select_format(request)
+        if export is None:
+            return Response(
+                'Неизвестный формат, доступны: {0}'.format(', '.join(formats)),
+                status=status.HTTP_400_BAD_REQUEST)
         try:
-            ingredients = self.create_shopping_cart_content(request)
+            shopping_cart = request.user.buyer
         except ShoppingCart.DoesNotExist:
             return Response('Список покупок пуст!',
                             status=status.HTTP_400_BAD_REQUEST)
-        shop_txt = self.create_ingredients_content(ingredients)
-        pdfmetrics.registerFont(
-            TTFont('Arial', 'arialbi.ttf', 'UTF-8'))
-        response = HttpResponse(
-            shop_txt, content_type='application/pdf')
-        filename = 'shopping_list.pdf'
-        response['Content-Disposition'] = 'attachment; filename={0}'.format(
-            filename)
-        page = canvas.Canvas(response)
-        page.setFont('Arial', size=24)
-        page.drawString(200, 800, 'Список покупок')
-        page.setFont('Arial', size=16)
-        height = 750
-        for i, (name, data) in enumerate(shop_txt.items(), 1):
-            page.drawString(75, height, (f'{i}. {name} - {data["amount"]} '
-                                         f'{data["measurement_unit"]}'))
-            height -= 25
-        page.showPage()
-        page.save()
+        digest = get_shopping_list_digest(shopping_cart)
+        etag = quote_etag(f'{digest}.{export.name}')
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        elif self.is_background(request, export, digest):
+            job = Job.objects.enqueue(RENDER_SHOPPING_LIST_TASK,
+                                      user=request.user)
+            return job_accepted(request, job)
+        else:
+            response = self.render_shopping_cart(shopping_cart, digest,
+                                                 export)
+            response['Content-Disposition'] = (
+                'attachment; filename={0}'.format(export.filename))
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept',))
         return response
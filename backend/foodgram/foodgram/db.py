@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+
+def close_unusable_connections():
+    """Закрыть постоянные соединения, которые разорвал сервер БД.
+
+    Django 3.2 проверяет соединения только после ошибки в запросе,
+    поэтому соединение, закрытое PostgreSQL или PgBouncer во время
+    простоя, иначе приводит к ошибке первого запроса к БД.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
+
+
+class ConnectionHealthCheckMiddleware(MiddlewareMixin):
+    """Проверка постоянных соединений с БД перед обработкой запроса"""
+
+    def __init__(self, get_response):
+        if (not settings.DB_CONN_HEALTH_CHECKS
+                or settings.DB_CONN_MAX_AGE == 0):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        close_unusable_connections()
@@ -1,6 +1,40 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class LimitCursorPagination(CursorPagination):
+    """Пагинация по ключу без OFFSET и подсчета количества объектов"""
+    page_size_query_param = 'limit'
+    page_size = 6
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = (queryset.query.order_by
+                    or queryset.model._meta.ordering)
+        if ordering:
+            return tuple(ordering)
+        return super().get_ordering(request, queryset, view)
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация.
+
+    Если в запросе передан параметр cursor (в том числе пустой),
+    используется пагинация по ключу LimitCursorPagination.
+    """
     page_size_query_param = 'limit'
     page_size = 6
+    cursor_pagination_class = LimitCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_paginator = self.cursor_pagination_class()
+        if cursor_paginator.cursor_query_param in request.query_params:
+            self.cursor_paginator = cursor_paginator
+            return cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
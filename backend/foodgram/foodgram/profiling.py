@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def get_view_name(request, view_func):
+    """Имя обработчика вида RecipeViewSet.list"""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        labels = [f'<={bucket}' for bucket in self.buckets]
+        labels.append(f'>{self.buckets[-1]}')
+        return {
+            'total': round(self.total, 3),
+            'max': round(self.max, 3),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.count = 0
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_ms = Histogram(TIME_BUCKETS_MS)
+        self.app_ms = Histogram(TIME_BUCKETS_MS)
+        self.render_ms = Histogram(TIME_BUCKETS_MS)
+        self.total_ms = Histogram(TIME_BUCKETS_MS)
+
+    def add(self, profile):
+        self.count += 1
+        self.queries.add(profile.queries)
+        self.db_ms.add(profile.db_ms)
+        self.app_ms.add(profile.app_ms)
+        self.render_ms.add(profile.render_ms)
+        self.total_ms.add(profile.total_ms)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'queries': self.queries.as_dict(),
+            'db_ms': self.db_ms.as_dict(),
+            'app_ms': self.app_ms.as_dict(),
+            'render_ms': self.render_ms.as_dict(),
+            'total_ms': self.total_ms.as_dict(),
+        }
+
+
+class ProfilingStats:
+    """Накопленная статистика запросов в памяти процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def add(self, profile):
+        with self._lock:
+            endpoint = self._endpoints.setdefault(
+                profile.name, EndpointStats())
+            endpoint.add(profile)
+
+    def as_dict(self):
+        with self._lock:
+            return {name: endpoint.as_dict()
+                    for name, endpoint in sorted(self._endpoints.items())}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+stats = ProfilingStats()
+
+
+class RequestProfile:
+    """Замеры одного запроса"""
+
+    def __init__(self):
+        self.name = None
+        self.queries = 0
+        self.db_ms = 0.0
+        self.started = perf_counter()
+        self.view_started = None
+        self.view_finished = None
+        self.finished = None
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (perf_counter() - started) * 1000
+
+    @property
+    def total_ms(self):
+        return (self.finished - self.started) * 1000
+
+    @property
+    def render_ms(self):
+        if self.view_finished is None:
+            return 0.0
+        return (self.finished - self.view_finished) * 1000
+
+    @property
+    def app_ms(self):
+        """Время работы кода вида без учета запросов к БД"""
+        if self.view_started is None:
+            return 0.0
+        view_finished = self.view_finished or self.finished
+        return max((view_finished - self.view_started) * 1000
+                   - self.db_ms, 0.0)
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.db_ms:.2f};desc="{self.queries} queries"',
+            f'app;dur={self.app_ms:.2f}',
+            f'render;dur={self.render_ms:.2f}',
+            f'total;dur={self.total_ms:.2f}',
+        ))
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Учесть запрос к БД в замерах текущего HTTP-запроса"""
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.execute_wrapper(execute, sql, params, many, context)
+
+
+def install_execute_wrapper(connection, **kwargs):
+    """Подключить execute_wrapper к соединению с БД.
+
+    Соединения свои у каждого потока: под ASGI виды выполняются в потоке
+    синхронного кода или в пуле threadpool. Поэтому обертка ставится
+    на каждое соединение при его создании, а замеры запроса она находит
+    через current_profile, который asgiref передает в эти потоки.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def check_query_budget(profile):
+    budget = settings.PROFILING_QUERY_BUDGETS.get(profile.name)
+    if budget is None or profile.queries <= budget:
+        return
+    message = (f'{profile.name}: выполнено {profile.queries} запросов к БД '
+               f'при бюджете {budget}')
+    if settings.PROFILING_QUERY_BUDGETS_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """Замер количества запросов к БД и времени обработки запроса.
+
+    Результаты отдаются в заголовке Server-Timing и накапливаются
+    по обработчикам в ProfilingStats.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        connection_created.connect(install_execute_wrapper,
+                                   dispatch_uid='profiling')
+        for connection in connections.all():
+            install_execute_wrapper(connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        profile = request.profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish_profile(profile, response)
+
+    async def __acall__(self, request):
+        profile = request.profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish_profile(profile, response)
+
+    def finish_profile(self, profile, response):
+        profile.finished = perf_counter()
+        if profile.name is not None:
+            stats.add(profile)
+            response['Server-Timing'] = profile.server_timing()
+            check_query_budget(profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profile.name = get_view_name(request, view_func)
+        request.profile.view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        request.profile.view_finished = perf_counter()
+        return response
+
+
+class ProfilingView(APIView):
+    """Статистика запросов по обработчикам"""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(stats.as_dict(), status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
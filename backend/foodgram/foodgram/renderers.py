@@ -0,0 +1,27 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON-рендерер на orjson, если он установлен.
+
+    Результат совпадает с JSONRenderer, который используется для вывода
+    с отступами и когда orjson нет.
+    """
+    encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(
+                accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Ошибки ListField и DictField приходят со словарями с ключами-числами.
+        ret = orjson.dumps(data, default=self.encoder.default,
+                           option=orjson.OPT_NON_STR_KEYS)
+        # Как в JSONRenderer: эти символы допустимы в JSON, но не в JS.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
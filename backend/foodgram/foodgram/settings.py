@@ -18,6 +18,8 @@ ALLOWED_HOSTS = os.getenv('HOSTS', default='158.160.1.73').split()
 INSTALLED_APPS = [
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -33,6 +35,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'foodgram.profiling.ProfilingMiddleware',
+    'foodgram.db.ConnectionHealthCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +66,26 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# Время жизни соединения с БД в секундах: 0 - новое соединение на каждый
+# запрос, None - без ограничения.
+DB_CONN_MAX_AGE = os.getenv('DB_CONN_MAX_AGE', default='60')
+DB_CONN_MAX_AGE = None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE)
+
+# Проверять постоянное соединение перед обработкой запроса. Проверка -
+# это запрос к БД, в том числе для ответов из кэша, поэтому ее стоит
+# включать, только если сервер или PgBouncer закрывает простаивающие
+# соединения раньше DB_CONN_MAX_AGE.
+DB_CONN_HEALTH_CHECKS = (
+    os.getenv('DB_CONN_HEALTH_CHECKS', default='False') == 'True')
+
+# Подключение через PgBouncer в режиме pool_mode=transaction.
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', default='False') == 'True'
+
+# Ограничение времени выполнения запроса к PostgreSQL в миллисекундах.
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', default=0))
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE'),
@@ -69,7 +93,35 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+        'OPTIONS': {},
+    }
+}
+
+# PgBouncer не принимает параметры запуска, поэтому с ним таймаут
+# задается на стороне PostgreSQL (ALTER ROLE ... SET statement_timeout).
+if (DB_STATEMENT_TIMEOUT and not DB_PGBOUNCER
+        and 'postgresql' in (DATABASES['default']['ENGINE'] or '')):
+    DATABASES['default']['OPTIONS']['options'] = (
+        f'-c statement_timeout={DB_STATEMENT_TIMEOUT}')
+
+# Кэш должен быть общим для всех процессов (веб-воркеров и обработчиков
+# задач) и храниться в памяти: ревизии списков покупок, лент и токенов
+# читаются на каждом запросе. При заданном CACHE_LOCATION это Redis,
+# без него (разработка и тесты) - кэш в памяти процесса.
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', default='')
+
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    default=('django_redis.cache.RedisCache' if CACHE_LOCATION
+             else 'django.core.cache.backends.locmem.LocMemCache'))
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
     }
 }
 
@@ -104,10 +156,39 @@ STATIC_ROOT = BASE_DIR / 'static_backend/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', default=2))
+
+IMAGE_VARIANTS_IN_JOBS = (
+    os.getenv('IMAGE_VARIANTS_IN_JOBS', default='False') == 'True')
+
+# Выполнение медленных видов в пуле потоков при запуске через ASGI
+# (включается в foodgram/asgi.py).
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='False') == 'True'
+
+ASYNC_VIEWS_THREADS = int(os.getenv('ASYNC_VIEWS_THREADS', default=20))
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', default=2))
+
+JOB_MAX_ATTEMPTS = 3
+
+JOB_TIMEOUT = 600
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', default=10000))
+
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=60))
+
+# Хранить токены также в кэше Django, общем для процессов.
+TOKEN_CACHE_SHARED = (
+    os.getenv('TOKEN_CACHE_SHARED', default='False') == 'True')
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ]
+        'users.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodgram.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 DJOSER = {
@@ -126,4 +207,24 @@ DJOSER = {
 
 EMPTY_VALUE_DISPLAY = '-пусто-'
 
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', default='False') == 'True'
+
+# Измерены на PostgreSQL и SQLite с общим кэшем в памяти при пустом кэше
+# (самый дорогой случай), проверяются в api.tests.QueryBudgetTest.
+PROFILING_QUERY_BUDGETS = {
+    'RecipeViewSet.list': 6,
+    'RecipeViewSet.retrieve': 5,
+    'RecipeViewSet.feed': 5,
+    'RecipeViewSet.create': 11,
+    'RecipeViewSet.update': 22,
+    'RecipeViewSet.partial_update': 22,
+    'RecipeViewSet.favorite_batch': 7,
+    'RecipeViewSet.shopping_cart_batch': 17,
+    'CustomUsersViewSet.subscriptions': 4,
+    'ShoppingCartViewSet.download_shopping_cart': 4,
+}
+
+PROFILING_QUERY_BUDGETS_STRICT = (
+    os.getenv('PROFILING_QUERY_BUDGETS_STRICT', default='False') == 'True')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.http import HttpResponse
+from django.urls import URLPattern
+from rest_framework.routers import DefaultRouter
+
+from .db import close_unusable_connections
+from .profiling import install_execute_wrapper
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEWS_THREADS,
+    thread_name_prefix='async-views')
+
+
+def materialize(response):
+    """Собрать потоковый ответ в обычный.
+
+    Django 3.2 перебирает потоковый ответ в цикле событий, поэтому
+    чтение файла и запись в кэш выполняются заранее в потоке пула.
+    """
+    content = b''.join(response.streaming_content)
+    result = HttpResponse(content, status=response.status_code)
+    for header, value in response.items():
+        result[header] = value
+    response.close()
+    return result
+
+
+def call_view(view, request, *args, **kwargs):
+    """Выполнить вид в потоке пула со своим соединением с БД"""
+    close_old_connections()
+    if settings.DB_CONN_HEALTH_CHECKS:
+        close_unusable_connections()
+    if settings.PROFILING_ENABLED:
+        for connection in connections.all():
+            install_execute_wrapper(connection)
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response = response.render()
+        if response.streaming:
+            response = materialize(response)
+        return response
+    finally:
+        close_old_connections()
+
+
+def run_in_thread_pool(view):
+    """Асинхронная обертка синхронного вида для режима ASGI.
+
+    Вид выполняется в отдельном пуле потоков, а не в общем потоке
+    синхронного кода, поэтому медленные клиенты не блокируют друг друга.
+    Без ASYNC_VIEWS вид возвращается без изменений.
+    """
+    if not settings.ASYNC_VIEWS:
+        return view
+    run = sync_to_async(call_view, thread_sensitive=False, executor=executor)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await run(view, request, *args, **kwargs)
+    return async_view
+
+
+class ThreadPoolRouter(DefaultRouter):
+    """Роутер, выполняющий в пуле потоков действия из thread_pool_actions"""
+
+    def get_urls(self):
+        return [self.wrap_url(url) for url in super().get_urls()]
+
+    def wrap_url(self, url):
+        view_class = getattr(url.callback, 'cls', None)
+        actions = getattr(url.callback, 'actions', None) or {}
+        thread_pool_actions = getattr(view_class, 'thread_pool_actions', ())
+        if not set(actions.values()) & set(thread_pool_actions):
+            return url
+        return URLPattern(url.pattern, run_in_thread_pool(url.callback),
+                          url.default_args, url.name)
@@ -1,9 +1,13 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from .profiling import ProfilingView
+
 api = [
     path('', include('api.urls')),
     path('', include('users.urls')),
+    path('', include('jobs.urls')),
+    path('profiling/', ProfilingView.as_view(), name='profiling'),
 ]
 
 urlpatterns = [
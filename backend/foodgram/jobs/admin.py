@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from foodgram.settings import EMPTY_VALUE_DISPLAY
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'user', 'status', 'attempts',
+                    'created', 'finished')
+    list_filter = ('status', 'name')
+    readonly_fields = ('locked_by', 'locked_at', 'result', 'error',
+                       'created', 'finished')
+    exclude = ('output',)
+    empty_value_display = EMPTY_VALUE_DISPLAY
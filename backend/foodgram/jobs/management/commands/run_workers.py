@@ -0,0 +1,49 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import work
+
+
+class Command(BaseCommand):
+    help = 'Запуск обработчиков фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.JOB_WORKERS,
+            help='Количество процессов-обработчиков')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза между проверками пустой очереди, с')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Завершиться, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=work,
+                kwargs={'poll_interval': options['poll_interval'],
+                        'once': options['once']},
+                daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(
+            f'Запущено обработчиков: {len(processes)}')
+
+        def stop(signum, frame):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stop(None, None)
@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from users.models import User
+
+TIMEOUT_ERROR = 'Задача не завершилась за отведенное время'
+
+
+class JobQuerySet(models.QuerySet):
+
+    def enqueue(self, name, user=None, **kwargs):
+        """Поставить задачу в очередь"""
+        return self.create(name=name, user=user, kwargs=kwargs)
+
+    def claim(self, worker):
+        """Взять задачу из очереди, если она есть.
+
+        Задачи, которые выполняются дольше JOB_TIMEOUT, считаются
+        потерянными (например, обработчик был остановлен) и берутся снова,
+        пока не исчерпаны попытки, а затем завершаются с ошибкой.
+        """
+        now = timezone.now()
+        expired = now - timedelta(seconds=settings.JOB_TIMEOUT)
+        with transaction.atomic():
+            self.filter(
+                status=Job.RUNNING, locked_at__lt=expired,
+                attempts__gte=F('max_attempts'),
+            ).update(status=Job.FAILED, error=TIMEOUT_ERROR, finished=now,
+                     locked_by='', locked_at=None)
+            job = (
+                self.select_for_update(skip_locked=True)
+                .filter(Q(status=Job.QUEUED, run_after__lte=now)
+                        | Q(status=Job.RUNNING, locked_at__lt=expired,
+                            attempts__lt=F('max_attempts')))
+                .order_by('run_after', 'pk')
+                .first()
+            )
+            if job is None:
+                return None
+            claimed = self.filter(
+                pk=job.pk, status=job.status, locked_at=job.locked_at,
+            ).update(status=Job.RUNNING, locked_by=worker, locked_at=now,
+                     attempts=F('attempts') + 1)
+        if not claimed:
+            return None
+        job.refresh_from_db()
+        return job
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=100)
+    kwargs = models.JSONField('Аргументы', default=dict)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name='Пользователь'
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток',
+        default=settings.JOB_MAX_ATTEMPTS
+    )
+    run_after = models.DateTimeField('Запустить после', default=timezone.now)
+    locked_by = models.CharField('Обработчик', max_length=100, blank=True)
+    locked_at = models.DateTimeField('Взята в работу', null=True, blank=True)
+    result = models.JSONField('Результат', null=True, blank=True)
+    output = models.BinaryField('Файл', null=True, blank=True)
+    output_content_type = models.CharField(
+        'Тип файла', max_length=100, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = (
+            models.Index(fields=('status', 'run_after'),
+                         name='job_queue_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.get_status_display()})'
@@ -0,0 +1,13 @@
+tasks = {}
+
+
+def task(name):
+    """Зарегистрировать функцию как фоновую задачу.
+
+    Функция получает объект Job и аргументы задачи и возвращает
+    результат, который можно сохранить в JSON.
+    """
+    def decorator(func):
+        tasks[name] = func
+        return func
+    return decorator
@@ -0,0 +1,25 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Сериализатор состояния фоновой задачи"""
+    url = serializers.SerializerMethodField()
+    output_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'name', 'status', 'attempts', 'result', 'error',
+                  'created', 'finished', 'url', 'output_url')
+
+    def get_url(self, obj):
+        return reverse('jobs:jobs-detail', args=(obj.pk,),
+                       request=self.context.get('request'))
+
+    def get_output_url(self, obj):
+        if obj.status != Job.DONE or not obj.output_content_type:
+            return None
+        return reverse('jobs:jobs-output', args=(obj.pk,),
+                       request=self.context.get('request'))
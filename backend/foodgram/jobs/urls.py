@@ -0,0 +1,14 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from .views import JobViewSet
+
+app_name = 'jobs'
+
+router_v1 = DefaultRouter()
+
+router_v1.register('jobs', JobViewSet, basename='jobs')
+
+urlpatterns = [
+    path('', include(router_v1.urls)),
+]
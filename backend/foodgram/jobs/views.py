@@ -0,0 +1,41 @@
+from django.http import HttpResponse
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .models import Job
+from .serializers import JobSerializer
+
+
+def job_accepted(request, job):
+    """Ответ 202 со ссылкой на поставленную в очередь задачу"""
+    serializer = JobSerializer(job, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': serializer.data['url']})
+
+
+class JobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Состояние фоновых задач пользователя"""
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user).defer('output')
+
+    @action(detail=True, methods=('get',))
+    def output(self, request, pk=None):
+        """Файл, сформированный задачей"""
+        job = self.get_object()
+        if job.status != Job.DONE or not job.output_content_type:
+            return Response('Результат еще не готов.',
+                            status=status.HTTP_404_NOT_FOUND)
+        job = Job.objects.only('output', 'output_content_type', 'result').get(
+            pk=job.pk)
+        response = HttpResponse(bytes(job.output),
+                                content_type=job.output_content_type)
+        filename = (job.result or {}).get('filename')
+        if filename:
+            response['Content-Disposition'] = (
+                'attachment; filename={0}'.format(filename))
+        return response
@@ -0,0 +1,73 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from .models import Job
+from .registry import tasks
+
+logger = logging.getLogger(__name__)
+
+RESULT_FIELDS = ('status', 'result', 'output', 'output_content_type',
+                 'error', 'run_after', 'finished', 'locked_by', 'locked_at')
+
+
+def run_job(job):
+    """Выполнить задачу и сохранить результат или ошибку.
+
+    Результат сохраняется, только если задачу за это время не взял
+    другой обработчик после истечения JOB_TIMEOUT.
+    """
+    lock = {'locked_by': job.locked_by, 'locked_at': job.locked_at}
+    try:
+        func = tasks[job.name]
+        job.result = func(job, **job.kwargs)
+    except Exception:
+        job.error = traceback.format_exc()
+        logger.exception('Задача %s завершилась с ошибкой', job)
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(
+                seconds=2 ** job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.error = ''
+        job.finished = timezone.now()
+    job.locked_by = ''
+    job.locked_at = None
+    saved = Job.objects.filter(pk=job.pk, **lock).update(
+        **{field: getattr(job, field) for field in RESULT_FIELDS})
+    if not saved:
+        logger.warning('Задача %s передана другому обработчику, '
+                       'результат не сохранен', job)
+
+
+def work(poll_interval=1.0, once=False):
+    """Обрабатывать задачи из очереди.
+
+    С once=True обработчик завершается, когда очередь опустеет.
+    """
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    connections.close_all()
+    while True:
+        try:
+            job = Job.objects.claim(worker)
+        except DatabaseError:
+            logger.exception('Не удалось получить задачу из очереди')
+            connections.close_all()
+            time.sleep(poll_interval)
+            continue
+        if job is not None:
+            run_job(job)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
@@ -1,9 +1,8 @@
 from django.contrib import admin
-from django.db.models import Count, Sum
 
 from foodgram.settings import EMPTY_VALUE_DISPLAY
-from .models import (Ingredient, IngredientsAmount, Recipe,
-                     ShoppingCart, Tag, Favorite)
+from .models import (Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingListItem, Tag, Favorite)
 
 
 @admin.register(Tag)
@@ -24,22 +23,44 @@ class IngredientAdmin(admin.ModelAdmin):
     empty_value_display = EMPTY_VALUE_DISPLAY
 
 
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    autocomplete_fields = ('ingredient',)
+    extra = 1
+
+
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('author',
-                    'name', 'image', 'text', 'cooking_time')
+                    'name', 'image', 'text', 'cooking_time',
+                    'favorites_count', 'in_carts_count')
     search_fields = ('name',)
     list_filter = ('name',)
+    inlines = (RecipeIngredientInline,)
     empty_value_display = EMPTY_VALUE_DISPLAY
 
+    def get_amounts(self, recipe):
+        return dict(RecipeIngredient.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount'))
 
-@admin.register(IngredientsAmount)
-class IngredientsAmountAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'ingredients', 'amount')
-    list_editable = ('ingredients', 'amount')
-    search_fields = ('ingredients',)
-    list_filter = ('ingredients',)
-    empty_value_display = EMPTY_VALUE_DISPLAY
+    def save_related(self, request, form, formsets, change):
+        """Перенести изменения ингредиентов в списки покупок"""
+        before = self.get_amounts(form.instance) if change else {}
+        super().save_related(request, form, formsets, change)
+        after = self.get_amounts(form.instance)
+        deltas = {
+            ingredient_id: after.get(ingredient_id, 0)
+            - before.get(ingredient_id, 0)
+            for ingredient_id in before.keys() | after.keys()
+        }
+        ShoppingListItem.objects.change_recipe(
+            form.instance.pk, {ingredient_id: delta for ingredient_id, delta
+                               in deltas.items() if delta})
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and queryset.is_postgresql():
+            return queryset.search(search_term), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(ShoppingCart)
@@ -54,9 +75,7 @@ class ShoppingCartAdmin(admin.ModelAdmin):
 
     @admin.display(description='Количество ингредиентов')
     def count_ingredients(self, obj):
-        return (
-            obj.recipe.all().annotate(count_ingredients=Count('ingredients'))
-            .aggregate(total=Sum('count_ingredients'))['total'])
+        return RecipeIngredient.objects.filter(recipe__purchase=obj).count()
 
 
 @admin.register(Favorite)
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     name = 'recipes'
     verbose_name = 'Управление рецптами'
+
+    def ready(self):
+        from . import signals
+        post_migrate.connect(signals.create_trigram_index, sender=self)
+        post_migrate.connect(signals.create_prefix_index, sender=self)
+        post_migrate.connect(signals.create_search_index, sender=self)
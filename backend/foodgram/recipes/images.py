@@ -0,0 +1,103 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, features
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+VARIANTS_DIR = 'recipes/images/variants/'
+IMAGE_VARIANTS_TASK = 'recipes.image_variants'
+QUALITY = 80
+RESAMPLE = getattr(Image, 'Resampling', Image).LANCZOS
+
+if features.check('webp'):
+    FORMAT, EXTENSION = 'WEBP', 'webp'
+else:
+    FORMAT, EXTENSION = 'JPEG', 'jpg'
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_VARIANT_WORKERS,
+    thread_name_prefix='image-variants')
+
+
+def get_variant_name(image_name, variant):
+    """Имя файла копии: имя оригинала уже содержит хеш его содержимого"""
+    base_name = posixpath.splitext(posixpath.basename(image_name))[0]
+    return f'{VARIANTS_DIR}{base_name}_{variant}.{EXTENSION}'
+
+
+def get_variant_urls_for(image_name, image_variants_for):
+    """Ссылки на копии картинки или на оригинал, пока копий нет"""
+    if not image_name:
+        return {variant: None for variant in VARIANTS}
+    if image_variants_for != image_name:
+        url = default_storage.url(image_name)
+        return {variant: url for variant in VARIANTS}
+    return {variant: default_storage.url(get_variant_name(image_name, variant))
+            for variant in VARIANTS}
+
+
+def get_variant_urls(recipe):
+    return get_variant_urls_for(recipe.image.name, recipe.image_variants_for)
+
+
+def resize(original, size):
+    image = original.copy()
+    image.thumbnail(size, RESAMPLE)
+    if FORMAT == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, FORMAT, quality=QUALITY)
+    return buffer.getvalue()
+
+
+def generate_variants(recipe_id, image_name):
+    """Создать копии картинки рецепта всех размеров"""
+    from .models import Recipe
+
+    with default_storage.open(image_name) as file:
+        original = Image.open(file)
+        original.load()
+    for variant, size in VARIANTS.items():
+        name = get_variant_name(image_name, variant)
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(resize(original, size)))
+    Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_variants_for=image_name)
+
+
+def generate_variants_in_thread(recipe_id, image_name):
+    try:
+        generate_variants(recipe_id, image_name)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+    finally:
+        # Поток пула остается жить: соединение сохраняется в нем на
+        # CONN_MAX_AGE, как в обработчике запросов.
+        close_old_connections()
+
+
+def schedule_variants(recipe_id, image_name):
+    """Поставить обработку картинки в очередь.
+
+    Если IMAGE_VARIANTS_IN_JOBS включен, картинка обрабатывается
+    фоновой задачей, иначе - в пуле потоков текущего процесса.
+    """
+    if settings.IMAGE_VARIANTS_IN_JOBS:
+        Job.objects.enqueue(IMAGE_VARIANTS_TASK, recipe_id=recipe_id,
+                            image_name=image_name)
+    else:
+        executor.submit(generate_variants_in_thread, recipe_id, image_name)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe, RecipeIngredient
+
+from .load_ingredients import batched
+
+LEGACY_FIELDS = ('recipe_id', 'ingredientsamount__ingredients_id',
+                 'ingredientsamount__amount')
+
+
+class Command(BaseCommand):
+    help = ('Перенос ингредиентов рецептов из общей таблицы '
+            'IngredientsAmount в RecipeIngredient')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одной вставке')
+
+    def handle(self, *args, **options):
+        rows = (Recipe.ingredients.through.objects
+                .order_by('pk')
+                .values_list(*LEGACY_FIELDS)
+                .iterator(chunk_size=options['batch_size']))
+        total = 0
+        with transaction.atomic():
+            for batch in batched(rows, options['batch_size']):
+                RecipeIngredient.objects.bulk_create(
+                    (RecipeIngredient(recipe_id=recipe_id,
+                                      ingredient_id=ingredient_id,
+                                      amount=amount)
+                     for recipe_id, ingredient_id, amount in batch),
+                    ignore_conflicts=True)
+                total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано связей рецептов с ингредиентами: {total}, '
+            f'строк в RecipeIngredient: {RecipeIngredient.objects.count()}'))
@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+
+DEFAULT_PATH = settings.BASE_DIR.parent.parent / 'data' / 'ingredients.json'
+CHUNK_SIZE = 64 * 1024
+FIELDS = ('name', 'measurement_unit')
+
+
+def iter_json(file, chunk_size=CHUNK_SIZE):
+    """Разобрать JSON-массив объектов, не читая файл целиком"""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Файл должен содержать JSON-массив.')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            end = None
+        if end is None or (end == len(buffer) and not eof):
+            if eof:
+                raise CommandError('Некорректный JSON в файле.')
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_csv(file):
+    """Прочитать строки CSV с необязательным заголовком"""
+    for row in csv.reader(file):
+        if not row or tuple(row) == FIELDS:
+            continue
+        yield dict(zip(FIELDS, row))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+class Command(BaseCommand):
+    help = 'Загрузка ингредиентов из JSON- или CSV-файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=str(DEFAULT_PATH),
+            help='Путь к файлу с ингредиентами')
+        parser.add_argument(
+            '--format', choices=('json', 'csv'),
+            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одной вставке')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загружать через COPY (только PostgreSQL)')
+
+    def read_rows(self, file, file_format):
+        items = iter_json(file) if file_format == 'json' else iter_csv(file)
+        for item in items:
+            try:
+                name = item['name'].strip()
+                measurement_unit = item['measurement_unit'].strip()
+            except (AttributeError, KeyError, TypeError):
+                raise CommandError(f'Некорректная запись: {item!r}')
+            if name:
+                yield name, measurement_unit
+
+    def new_rows(self, rows):
+        """Отбросить ингредиенты, которые уже есть в базе или в файле"""
+        seen = set(Ingredient.objects.values_list(*FIELDS))
+        for row in rows:
+            if row not in seen:
+                seen.add(row)
+                yield row
+
+    def insert(self, batch):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in batch)
+
+    def copy(self, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {table} ({", ".join(FIELDS)}) '
+                f'FROM STDIN WITH (FORMAT csv)', buffer)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден.')
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in ('json', 'csv'):
+            raise CommandError('Поддерживаются только форматы json и csv.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('COPY доступен только для PostgreSQL.')
+        write = self.copy if options['copy'] else self.insert
+
+        started = time.monotonic()
+        total = 0
+        with path.open(encoding='utf-8', newline='') as file:
+            with transaction.atomic():
+                rows = self.new_rows(self.read_rows(file, file_format))
+                for batch in batched(rows, options['batch_size']):
+                    write(batch)
+                    total += len(batch)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено ингредиентов: {total} за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else 0:.0f} строк/с)'))
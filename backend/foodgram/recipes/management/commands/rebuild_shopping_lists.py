@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересборка списков покупок из рецептов в корзинах пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Пересобрать только список пользователя с этим id')
+
+    def handle(self, *args, **options):
+        ShoppingListItem.objects.rebuild(options['users'])
+        items = ShoppingListItem.objects.all()
+        if options['users']:
+            items = items.filter(user_id__in=options['users'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Позиций в списках покупок: {items.count()}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef
+
+from recipes.models import Favorite, Recipe, ShoppingCart, count_subquery
+
+
+class Command(BaseCommand):
+    help = 'Пересчет счетчиков избранного и списков покупок у рецептов'
+
+    def handle(self, *args, **options):
+        favorites_count = count_subquery(
+            Favorite.objects.filter(recipe=OuterRef('pk')))
+        in_carts_count = count_subquery(
+            ShoppingCart.recipe.through.objects.filter(recipe=OuterRef('pk')))
+        drifted = (
+            Recipe.objects
+            .annotate(actual_favorites_count=favorites_count,
+                      actual_in_carts_count=in_carts_count)
+            .exclude(favorites_count=F('actual_favorites_count'),
+                     in_carts_count=F('actual_in_carts_count'))
+            .values_list('pk', flat=True)
+        )
+        updated = Recipe.objects.filter(pk__in=list(drifted)).update(
+            favorites_count=favorites_count, in_carts_count=in_carts_count)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлены счетчики рецептов: {updated}'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.models import Recipe
+
+from .load_ingredients import batched
+
+
+class Command(BaseCommand):
+    help = 'Пересчет поискового вектора рецептов (только PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одном обновлении')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'Полнотекстовый поиск доступен только для PostgreSQL.')
+        recipe_ids = (Recipe.objects.order_by('pk')
+                      .values_list('pk', flat=True)
+                      .iterator(chunk_size=options['batch_size']))
+        total = 0
+        for batch in batched(recipe_ids, options['batch_size']):
+            total += Recipe.objects.filter(
+                pk__in=batch).update_search_vector()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлены поисковые векторы рецептов: {total}'))
@@ -1,7 +1,32 @@
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (Case, Count, Exists, F, IntegerField,
+                              OuterRef, Prefetch, Q, Subquery, Sum, Value,
+                              When)
+from django.db.models.functions import Coalesce, Upper
+
+from users.models import Follow, User
+
+
+class IngredientQuerySet(models.QuerySet):
+
+    def search(self, name):
+        """Ингредиенты, содержащие name; начинающиеся с name идут первыми"""
+        return self.filter(name__icontains=name).annotate(
+            match_rank=Case(
+                When(name__istartswith=name, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('match_rank', Upper('name'), 'pk')
+
 
-from users.models import User
+SEARCH_CONFIG = 'russian'
 
 
 class Ingredient(models.Model):
@@ -14,6 +39,8 @@ class Ingredient(models.Model):
         max_length=50
     )
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
@@ -43,6 +70,84 @@ class Tag(models.Model):
         return f'{self.name}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов без N+1 запросов при сериализации"""
+
+    def with_related(self, user=None):
+        """Подгрузить автора, теги и ингредиенты рецептов"""
+        return self.prefetch_related(
+            Prefetch('author',
+                     queryset=User.objects.with_is_subscribed(user)),
+            'tags',
+            Prefetch('recipe_ingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient')),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотировать поля is_favorited и is_in_shopping_cart"""
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=models.BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.recipe.through.objects.filter(
+                    shoppingcart__user=user, recipe=OuterRef('pk'))),
+        )
+
+    def for_user(self, user):
+        """Рецепты, готовые к выдаче пользователю"""
+        return self.with_related(user).with_user_flags(user).defer(
+            'search_vector')
+
+    def feed(self, user):
+        """Рецепты авторов, на которых подписан пользователь"""
+        return self.filter(author__in=Follow.objects.filter(
+            user=user).values('author_id'))
+
+    def is_postgresql(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def search(self, text):
+        """Полнотекстовый поиск по названию, описанию и ингредиентам.
+
+        В PostgreSQL используется search_vector с GIN-индексом, результаты
+        упорядочены по релевантности. На других СУБД - поиск вхождения
+        без ранжирования.
+        """
+        if not self.is_postgresql():
+            return self.filter(
+                Q(name__icontains=text) | Q(text__icontains=text)
+                | Exists(RecipeIngredient.objects.filter(
+                    recipe=OuterRef('pk'), ingredient__name__icontains=text)))
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return self.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-id')
+
+    def update_search_vector(self):
+        """Пересчитать search_vector рецептов (только PostgreSQL)"""
+        if not self.is_postgresql():
+            return 0
+        ingredient_names = Subquery(
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .order_by().values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names'))
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(Coalesce(ingredient_names, Value('')),
+                           weight='B', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -56,10 +161,14 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
     )
     text = models.TextField('Описание')
+    # Устаревшая связь через общие IngredientsAmount: данные переносятся
+    # в RecipeIngredient командой copy_recipe_ingredients.
     ingredients = models.ManyToManyField(
         'IngredientsAmount',
         related_name='recipes',
-        verbose_name='Ингредиенты',
+        verbose_name='Ингредиенты (устаревшее)',
+        blank=True,
+        editable=False,
     )
     cooking_time = models.PositiveIntegerField(
         'Время приготовления',
@@ -73,11 +182,39 @@ class Recipe(models.Model):
         related_name='recipes',
         verbose_name='Теги'
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
+    image_variants_for = models.CharField(
+        'Картинка, для которой созданы копии',
+        max_length=100,
+        blank=True,
+        editable=False
+    )
+    # GIN-индекс создается только в PostgreSQL, см. signals.py.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    POPULAR_ORDERING = ('-favorites_count', '-in_carts_count', '-id')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-id',)
+        indexes = (
+            models.Index(fields=('-favorites_count', '-in_carts_count', '-id'),
+                         name='recipe_popular_idx'),
+            models.Index(fields=('author', '-id'),
+                         name='recipe_author_idx'),
+        )
 
     def __str__(self):
         return f'{self.name}, автор: {self.author}'
@@ -112,6 +249,105 @@ class IngredientsAmount(models.Model):
                 f'{self.ingredients.measurement_unit}')
 
 
+class RecipeIngredient(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recipe_ingredients',
+        verbose_name='Рецепт'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='recipe_ingredients',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveSmallIntegerField(
+        verbose_name='Количество',
+        validators=(
+            MinValueValidator(0, 'Слишком маленькое количество!'),
+        )
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Ингредиент рецепта'
+        verbose_name_plural = 'Ингредиенты рецептов'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient'),
+        )
+
+    def __str__(self):
+        return (f'{self.ingredient.name} - {self.amount} '
+                f'{self.ingredient.measurement_unit}')
+
+
+def count_subquery(queryset):
+    """Количество строк queryset на рецепт для подзапроса по OuterRef"""
+    return Coalesce(
+        Subquery(queryset.order_by().values('recipe')
+                 .annotate(total=Count('pk')).values('total'),
+                 output_field=IntegerField()),
+        0)
+
+
+class FavoriteQuerySet(models.QuerySet):
+    """Пакетное изменение избранного пользователя.
+
+    Строки вставляются и удаляются без сигналов, поэтому favorites_count
+    пересчитывается здесь же по строкам, которые есть в БД. Сигналы
+    одиночных изменений избранного вызывают тот же recount.
+    """
+
+    def get_recipe_ids(self, user, recipe_ids):
+        return set(self.filter(user=user, recipe_id__in=recipe_ids)
+                   .values_list('recipe_id', flat=True))
+
+    def recount(self, recipe_ids):
+        """Пересчитать favorites_count рецептов.
+
+        Блокировка рецептов дожидается транзакций, которые уже изменили
+        их счетчики, и следующий запрос видит их строки избранного.
+        Поэтому счетчик не зависит от того, какие из строк вставил
+        или удалил именно этот запрос.
+        """
+        if not recipe_ids:
+            return
+        recipes = Recipe.objects.filter(pk__in=recipe_ids)
+        list(recipes.select_for_update().order_by('pk')
+             .values_list('pk', flat=True))
+        recipes.update(favorites_count=count_subquery(
+            self.model.objects.filter(recipe=OuterRef('pk'))))
+
+    @transaction.atomic
+    def add_recipes(self, user, recipe_ids):
+        """Добавить рецепты в избранное, вернуть id добавленных"""
+        existing = self.get_recipe_ids(user, recipe_ids)
+        added = [pk for pk in recipe_ids if pk not in existing]
+        self.bulk_create(
+            (Favorite(user=user, recipe_id=pk) for pk in added),
+            ignore_conflicts=True)
+        self.recount(added)
+        return added
+
+    @transaction.atomic
+    def remove_recipes(self, user, recipe_ids):
+        """Удалить рецепты из избранного, вернуть id удаленных"""
+        removed = set(
+            self.select_for_update()
+            .filter(user=user, recipe_id__in=recipe_ids)
+            .values_list('recipe_id', flat=True))
+        if removed:
+            # У избранного нет зависимых объектов, поэтому строки
+            # удаляются одним запросом, без сбора объектов и post_delete.
+            self.filter(user=user, recipe_id__in=removed)._raw_delete(
+                self.db)
+            self.recount(removed)
+        return [pk for pk in recipe_ids if pk in removed]
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(
         User,
@@ -126,6 +362,8 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
     )
 
+    objects = FavoriteQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Список избранного'
         verbose_name_plural = 'Списки избранного'
@@ -158,3 +396,133 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Список покупок пользователя {self.user}, {self.recipe.name}'
+
+    def get_recipe_ids(self, recipe_ids):
+        return set(self.recipe.filter(pk__in=recipe_ids)
+                   .values_list('pk', flat=True))
+
+    def add_recipes(self, recipe_ids):
+        """Добавить рецепты в список, вернуть id добавленных"""
+        existing = self.get_recipe_ids(recipe_ids)
+        added = [pk for pk in recipe_ids if pk not in existing]
+        if added:
+            self.recipe.add(*added)
+        return added
+
+    def remove_recipes(self, recipe_ids):
+        """Удалить рецепты из списка, вернуть id удаленных"""
+        existing = self.get_recipe_ids(recipe_ids)
+        removed = [pk for pk in recipe_ids if pk in existing]
+        if removed:
+            self.recipe.remove(*removed)
+        return removed
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    """Инкрементальное обновление списков покупок"""
+
+    @transaction.atomic
+    def apply(self, deltas):
+        """Прибавить к позициям списков покупок изменения количества.
+
+        deltas - итерируемое из (user_id, ingredient_id, delta). Позиции
+        с нулевым и отрицательным количеством удаляются.
+        """
+        totals = defaultdict(int)
+        for user_id, ingredient_id, delta in deltas:
+            totals[user_id, ingredient_id] += delta
+        totals = {key: delta for key, delta in totals.items() if delta}
+        if not totals:
+            return
+        users = {user_id for user_id, _ in totals}
+        ingredients = {ingredient_id for _, ingredient_id in totals}
+        self.bulk_create(
+            (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                              total=0)
+             for user_id, ingredient_id in totals),
+            ignore_conflicts=True)
+        items = [
+            item for item in self.select_for_update().filter(
+                user_id__in=users, ingredient_id__in=ingredients)
+            if (item.user_id, item.ingredient_id) in totals
+        ]
+        for item in items:
+            item.total = max(
+                item.total + totals[item.user_id, item.ingredient_id], 0)
+        self.bulk_update(items, ('total',))
+        self.filter(user_id__in=users, total=0).delete()
+
+    def add_recipes(self, user_ids, recipe_ids, sign=1):
+        """Добавить (sign=-1 - вычесть) ингредиенты рецептов пользователям"""
+        amounts = list(RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids).values_list('ingredient_id', 'amount'))
+        self.apply(
+            (user_id, ingredient_id, sign * amount)
+            for user_id in user_ids for ingredient_id, amount in amounts)
+
+    def change_recipe(self, recipe_id, deltas):
+        """Изменить списки покупок, в которых есть рецепт.
+
+        deltas - словарь ingredient_id: изменение количества.
+        """
+        if not deltas:
+            return
+        user_ids = ShoppingCart.objects.filter(
+            recipe=recipe_id).values_list('user_id', flat=True)
+        self.apply(
+            (user_id, ingredient_id, delta)
+            for user_id in user_ids for ingredient_id, delta in deltas.items())
+
+    def rebuild(self, user_ids=None):
+        """Пересобрать списки покупок из рецептов в корзинах"""
+        carts = ShoppingCart.recipe.through.objects.all()
+        if user_ids is not None:
+            carts = carts.filter(shoppingcart__user_id__in=user_ids)
+        rows = (
+            carts.order_by()
+            .values('shoppingcart__user_id',
+                    'recipe__recipe_ingredients__ingredient_id')
+            .annotate(total=Sum('recipe__recipe_ingredients__amount'))
+            .filter(total__gt=0)
+            .values_list('shoppingcart__user_id',
+                         'recipe__recipe_ingredients__ingredient_id', 'total')
+        )
+        with transaction.atomic():
+            items = self.all()
+            if user_ids is not None:
+                items = items.filter(user_id__in=user_ids)
+            items.delete()
+            self.bulk_create(
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                                 total=total)
+                for user_id, ingredient_id, total in rows)
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total = models.PositiveIntegerField('Количество', default=0)
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'ingredient'),
+                                    name='unique_shopping_list_item'),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.total}'
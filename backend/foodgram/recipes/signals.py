@@ -0,0 +1,190 @@
+import logging
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .images import schedule_variants
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                     ShoppingListItem)
+
+logger = logging.getLogger(__name__)
+
+TRIGRAM_INDEX_NAME = 'ingredient_name_trgm_idx'
+PREFIX_INDEX_NAME = 'ingredient_name_prefix_idx'
+SEARCH_INDEX_NAME = 'recipe_search_vector_idx'
+
+
+def create_trigram_index(using='default', **kwargs):
+    """Создать pg_trgm GIN-индекс для поиска ингредиентов по вхождению.
+
+    Индекс и расширение есть только в PostgreSQL, поэтому они создаются
+    после миграций, а на других СУБД поиск работает без них.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    quote_name = connection.ops.quote_name
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {quote_name(TRIGRAM_INDEX_NAME)} '
+                f'ON {quote_name(Ingredient._meta.db_table)} '
+                f'USING gin (UPPER({quote_name("name")}) gin_trgm_ops)')
+    except DatabaseError as error:
+        logger.warning('Не удалось создать индекс %s: %s',
+                       TRIGRAM_INDEX_NAME, error)
+
+
+def create_prefix_index(using='default', **kwargs):
+    """Создать индекс для поиска ингредиентов по началу названия.
+
+    Обычный B-tree по UPPER(name) не используется для LIKE 'X%', если
+    локаль БД отличается от C, поэтому нужен класс text_pattern_ops.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    quote_name = connection.ops.quote_name
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {quote_name(PREFIX_INDEX_NAME)} '
+                f'ON {quote_name(Ingredient._meta.db_table)} '
+                f'(UPPER({quote_name("name")}) text_pattern_ops)')
+    except DatabaseError as error:
+        logger.warning('Не удалось создать индекс %s: %s',
+                       PREFIX_INDEX_NAME, error)
+
+
+def create_search_index(using='default', **kwargs):
+    """Создать GIN-индекс по search_vector рецептов (только PostgreSQL)"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    quote_name = connection.ops.quote_name
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {quote_name(SEARCH_INDEX_NAME)} '
+                f'ON {quote_name(Recipe._meta.db_table)} '
+                f'USING gin ({quote_name("search_vector")})')
+    except DatabaseError as error:
+        logger.warning('Не удалось создать индекс %s: %s',
+                       SEARCH_INDEX_NAME, error)
+
+
+def change_counter(field, recipe_ids, delta):
+    """Атомарно изменить счетчик рецептов на delta"""
+    if recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            **{field: F(field) + delta})
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def recount_favorites(instance, **kwargs):
+    """Пересчитать favorites_count так же, как пакетные изменения"""
+    Favorite.objects.recount((instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def change_in_carts_count(instance, action, reverse, pk_set, **kwargs):
+    """Пересчитать in_carts_count при изменении списков покупок"""
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_carts_count = instance.purchase.count()
+        else:
+            instance._cleared_recipe_ids = list(
+                instance.recipe.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        if reverse:
+            change_counter('in_carts_count', (instance.pk,),
+                           -instance.__dict__.pop('_cleared_carts_count', 0))
+        else:
+            change_counter('in_carts_count',
+                           instance.__dict__.pop('_cleared_recipe_ids', ()),
+                           -1)
+    elif action in ('post_add', 'post_remove'):
+        delta = 1 if action == 'post_add' else -1
+        if reverse:
+            change_counter('in_carts_count', (instance.pk,),
+                           delta * len(pk_set))
+        else:
+            change_counter('in_carts_count', pk_set, delta)
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_variants(instance, **kwargs):
+    """Запустить создание копий картинки после сохранения рецепта"""
+    image_name = instance.image.name
+    if image_name and image_name != instance.image_variants_for:
+        transaction.on_commit(
+            lambda: schedule_variants(instance.pk, image_name))
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(instance, **kwargs):
+    """Пересчитать search_vector, когда ингредиенты рецепта уже записаны"""
+    transaction.on_commit(
+        lambda: Recipe.objects.filter(pk=instance.pk).update_search_vector())
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search_vector(instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(
+            lambda: Recipe.objects.filter(
+                recipe_ingredients__ingredient=instance
+            ).update_search_vector())
+
+
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def change_shopping_list_items(instance, action, reverse, pk_set, **kwargs):
+    """Добавить или вычесть ингредиенты рецептов в списках покупок"""
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_cart_users = list(
+                instance.purchase.values_list('user_id', flat=True))
+        else:
+            instance._cleared_cart_recipes = list(
+                instance.recipe.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        if reverse:
+            ShoppingListItem.objects.add_recipes(
+                instance.__dict__.pop('_cleared_cart_users', ()),
+                (instance.pk,), sign=-1)
+        else:
+            ShoppingListItem.objects.add_recipes(
+                (instance.user_id,),
+                instance.__dict__.pop('_cleared_cart_recipes', ()), sign=-1)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        sign = 1 if action == 'post_add' else -1
+        if reverse:
+            ShoppingListItem.objects.add_recipes(
+                ShoppingCart.objects.filter(pk__in=pk_set).values_list(
+                    'user_id', flat=True),
+                (instance.pk,), sign)
+        else:
+            ShoppingListItem.objects.add_recipes(
+                (instance.user_id,), pk_set, sign)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_shopping_lists(instance, **kwargs):
+    """Связи рецепта со списками покупок удаляются без m2m_changed"""
+    ShoppingListItem.objects.add_recipes(
+        ShoppingCart.objects.filter(recipe=instance).values_list(
+            'user_id', flat=True),
+        (instance.pk,), sign=-1)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_deleted_cart_recipes(instance, **kwargs):
+    """Связи списка покупок (и его владельца) удаляются без m2m_changed"""
+    recipe_ids = list(instance.recipe.values_list('pk', flat=True))
+    change_counter('in_carts_count', recipe_ids, -1)
+    ShoppingListItem.objects.add_recipes(
+        (instance.user_id,), recipe_ids, sign=-1)
@@ -0,0 +1,19 @@
+from django.core.management import call_command
+
+from jobs.registry import task
+
+from .images import IMAGE_VARIANTS_TASK, generate_variants
+
+LOAD_INGREDIENTS_TASK = 'recipes.load_ingredients'
+
+
+@task(IMAGE_VARIANTS_TASK)
+def image_variants_task(job, recipe_id, image_name):
+    generate_variants(recipe_id, image_name)
+    return {'image_name': image_name}
+
+
+@task(LOAD_INGREDIENTS_TASK)
+def load_ingredients_task(job, path, **options):
+    call_command('load_ingredients', path, **options)
+    return {'path': path}
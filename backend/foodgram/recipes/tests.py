@@ -0,0 +1,219 @@
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.management.commands.benchmark_api import IMAGE
+from users.models import User
+
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingListItem, Tag)
+
+
+class RecipeDataMixin:
+    """Покупатели со списками и рецепты с общими ингредиентами"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com')
+        cls.users = [
+            User.objects.create(username=f'buyer{i}',
+                                email=f'buyer{i}@example.com')
+            for i in range(2)
+        ]
+        cls.carts = [ShoppingCart.objects.create(user=user)
+                     for user in cls.users]
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(4)
+        ]
+        cls.recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}',
+                image='recipes/images/recipe.png', text='Описание',
+                cooking_time=10)
+            recipe.tags.add(cls.tag)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10 * (i + 1) + j)
+                for j, ingredient in enumerate(cls.ingredients[i:i + 2]))
+            cls.recipes.append(recipe)
+
+
+class ShoppingListSnapshotTest(RecipeDataMixin, TestCase):
+    """Инкрементальные списки покупок совпадают с пересобранными"""
+    def get_items(self):
+        return list(ShoppingListItem.objects.order_by(
+            'user_id', 'ingredient_id').values_list(
+                'user_id', 'ingredient_id', 'total'))
+
+    def assert_matches_rebuild(self):
+        items = self.get_items()
+        ShoppingListItem.objects.rebuild()
+        self.assertEqual(items, self.get_items())
+        return items
+
+    def fill_carts(self):
+        self.carts[0].recipe.add(*self.recipes[:2])
+        self.carts[1].recipe.add(*self.recipes[1:])
+        self.assertTrue(self.assert_matches_rebuild())
+
+    def test_cart_add_remove_and_clear(self):
+        self.fill_carts()
+        self.carts[0].recipe.remove(self.recipes[1])
+        self.assert_matches_rebuild()
+        self.recipes[2].purchase.add(self.carts[0])
+        self.assert_matches_rebuild()
+        self.recipes[2].purchase.remove(self.carts[1])
+        self.assert_matches_rebuild()
+        self.recipes[1].purchase.clear()
+        self.assert_matches_rebuild()
+        self.carts[0].recipe.clear()
+        self.assertEqual(
+            self.assert_matches_rebuild(),
+            [item for item in self.get_items()
+             if item[0] == self.users[1].pk])
+
+    def test_recipe_update_through_api(self):
+        self.fill_carts()
+        recipe = self.recipes[1]
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                response = client.put(f'/api/recipes/{recipe.pk}/', {
+                    'ingredients': [
+                        {'id': self.ingredients[1].pk, 'amount': 5},
+                        {'id': self.ingredients[3].pk, 'amount': 7},
+                    ],
+                    'tags': [self.tag.pk],
+                    'image': IMAGE,
+                    'name': recipe.name,
+                    'text': recipe.text,
+                    'cooking_time': recipe.cooking_time,
+                }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_matches_rebuild()
+
+    def test_recipe_inline_edit_in_admin(self):
+        self.fill_carts()
+        recipe = self.recipes[1]
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        self.client.force_login(admin)
+        prefix = 'recipe_ingredients'
+        rows = list(recipe.recipe_ingredients.all())
+        data = {
+            'author': self.author.pk,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'tags': [self.tag.pk],
+            f'{prefix}-TOTAL_FORMS': len(rows) + 1,
+            f'{prefix}-INITIAL_FORMS': len(rows),
+            f'{prefix}-MIN_NUM_FORMS': 0,
+            f'{prefix}-MAX_NUM_FORMS': 1000,
+            # Первая строка меняет количество, вторая удаляется,
+            # третья добавляет ингредиент.
+            f'{prefix}-0-amount': 99,
+            f'{prefix}-1-amount': rows[1].amount,
+            f'{prefix}-1-DELETE': 'on',
+            f'{prefix}-2-recipe': recipe.pk,
+            f'{prefix}-2-ingredient': self.ingredients[0].pk,
+            f'{prefix}-2-amount': 3,
+        }
+        for i, row in enumerate(rows):
+            data[f'{prefix}-{i}-id'] = row.pk
+            data[f'{prefix}-{i}-recipe'] = recipe.pk
+            data[f'{prefix}-{i}-ingredient'] = row.ingredient_id
+        response = self.client.post(
+            f'/admin/recipes/recipe/{recipe.pk}/change/', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            dict(recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount')),
+            {rows[0].ingredient_id: 99, self.ingredients[0].pk: 3})
+        self.assert_matches_rebuild()
+
+    def test_batch_cart_change(self):
+        self.fill_carts()
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        url = '/api/recipes/shopping_cart/'
+        ids = [recipe.pk for recipe in self.recipes]
+        response = client.post(url, {'recipes': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_matches_rebuild()
+        response = client.delete(url, {'recipes': ids[:2]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_matches_rebuild()
+
+    def test_recipe_deletion(self):
+        self.fill_carts()
+        self.recipes[1].delete()
+        self.assert_matches_rebuild()
+        self.author.delete()
+        self.assertEqual(self.assert_matches_rebuild(), [])
+
+
+class RecipeCounterTest(RecipeDataMixin, TestCase):
+    """Счетчики избранного и списков покупок совпадают с пересчитанными"""
+
+    def get_counters(self):
+        return list(Recipe.objects.order_by('pk').values_list(
+            'favorites_count', 'in_carts_count'))
+
+    def assert_counters(self, expected):
+        self.assertEqual(self.get_counters(), expected)
+        stdout = StringIO()
+        call_command('recount_recipes', stdout=stdout)
+        self.assertIn('Исправлены счетчики рецептов: 0', stdout.getvalue())
+
+    def test_favorites(self):
+        favorite = Favorite.objects.create(
+            user=self.users[0], recipe=self.recipes[0])
+        Favorite.objects.create(user=self.users[1], recipe=self.recipes[0])
+        Favorite.objects.create(user=self.users[1], recipe=self.recipes[2])
+        self.assert_counters([(2, 0), (0, 0), (1, 0)])
+        favorite.delete()
+        self.assert_counters([(1, 0), (0, 0), (1, 0)])
+
+    def test_shopping_carts(self):
+        self.carts[0].recipe.add(*self.recipes[:2])
+        self.recipes[1].purchase.add(self.carts[1])
+        self.assert_counters([(0, 1), (0, 2), (0, 0)])
+        self.carts[0].recipe.remove(self.recipes[0])
+        self.recipes[2].purchase.add(*self.carts)
+        self.assert_counters([(0, 0), (0, 2), (0, 2)])
+        self.recipes[1].purchase.clear()
+        self.assert_counters([(0, 0), (0, 0), (0, 2)])
+        self.carts[1].recipe.clear()
+        self.assert_counters([(0, 0), (0, 0), (0, 1)])
+
+    def test_user_deletion(self):
+        self.carts[0].recipe.add(*self.recipes)
+        self.carts[1].recipe.add(self.recipes[0])
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[1])
+        self.users[0].delete()
+        self.assert_counters([(0, 1), (0, 0), (0, 0)])
+        self.carts[1].delete()
+        self.assert_counters([(0, 0), (0, 0), (0, 0)])
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_popular_ordering(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[1])
+        Favorite.objects.create(user=self.users[1], recipe=self.recipes[1])
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[0])
+        self.carts[0].recipe.add(self.recipes[2])
+        self.carts[1].recipe.add(self.recipes[0])
+        response = APIClient().get('/api/recipes/', {'ordering': 'popular'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.recipes[i].pk for i in (1, 0, 2)])
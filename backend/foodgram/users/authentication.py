@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+CACHE_PREFIX = 'auth'
+
+# Хэш пароля не кэшируется: при обращении он загрузится из БД.
+USER_FIELDS = tuple(field.attname for field in User._meta.concrete_fields
+                    if field.attname != 'password')
+
+# Кэши, с которыми токены не кэшируются: ревизии в них не общие
+# для процессов или читаются запросом к БД, как и сам токен.
+UNSUITABLE_CACHES = (DatabaseCache, DummyCache, FileBasedCache, LocMemCache)
+
+TokenEntry = namedtuple('TokenEntry',
+                        ('user_id', 'revision', 'expires', 'values'))
+
+
+def get_revision_key(user_id):
+    return f'{CACHE_PREFIX}:user:{user_id}:revision'
+
+
+def get_token_key(key):
+    return f'{CACHE_PREFIX}:token:{key}'
+
+
+def get_revision(user_id):
+    key = get_revision_key(user_id)
+    revision = cache.get(key)
+    if revision is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        revision = cache.get(key)
+    return revision
+
+
+class TokenCache:
+    """Ограниченный по размеру LRU-кэш токенов в памяти процесса"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+
+
+def is_cache_shared():
+    """Кэш Django общий для процессов и хранится в памяти"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], UNSUITABLE_CACHES)
+
+
+def forget_token(key):
+    token_cache.delete(key)
+    if settings.TOKEN_CACHE_SHARED:
+        cache.delete(get_token_key(key))
+
+
+def invalidate_user(user_id):
+    """Сбросить закэшированные токены пользователя во всех процессах.
+
+    Ревизия пользователя хранится в кэше Django и проверяется при каждом
+    обращении к закэшированному токену. С кэшем в памяти процесса
+    ревизия не дошла бы до других процессов, а с кэшем в БД проверка
+    стоила бы запроса, поэтому токены тогда не кэшируются
+    (см. is_cache_shared).
+    """
+    cache.set(get_revision_key(user_id), uuid4().hex, timeout=None)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пользователя"""
+
+    def get_entry(self, key):
+        entry = token_cache.get(key)
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry = cache.get(get_token_key(key))
+            if entry is not None:
+                token_cache.set(key, entry)
+        if entry is None or entry.expires < time.time():
+            return None
+        if cache.get(get_revision_key(entry.user_id)) != entry.revision:
+            return None
+        return entry
+
+    def store_entry(self, key, user):
+        entry = TokenEntry(
+            user_id=user.pk,
+            revision=get_revision(user.pk),
+            expires=time.time() + settings.TOKEN_CACHE_TIMEOUT,
+            values=tuple(getattr(user, field) for field in USER_FIELDS),
+        )
+        token_cache.set(key, entry)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.set(get_token_key(key), entry,
+                      timeout=settings.TOKEN_CACHE_TIMEOUT)
+
+    def authenticate_credentials(self, key):
+        if not is_cache_shared():
+            return super().authenticate_credentials(key)
+        entry = self.get_entry(key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            self.store_entry(key, user)
+            return user, token
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, entry.values)
+        return user, Token(key=key, user=user)
@@ -1,5 +1,21 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Exists, OuterRef, Value
+
+
+class UserQuerySet(models.QuerySet):
+
+    def with_is_subscribed(self, user):
+        """Аннотировать поле is_subscribed для пользователя user"""
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_subscribed=Value(False, output_field=models.BooleanField()))
+        return self.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))))
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    """Менеджер пользователей с аннотациями подписок"""
 
 
 class User(AbstractUser):
@@ -12,6 +28,8 @@ class User(AbstractUser):
     is_superuser = models.BooleanField('Администратор', default=False)
     is_blocked = models.BooleanField('Заблокирован', default=False)
 
+    objects = CustomUserManager()
+
     @property
     def is_admin(self):
         return self.is_superuser or self.is_staff
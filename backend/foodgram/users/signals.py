@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token, invalidate_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Изменения пользователя, в том числе is_blocked, сбрасывают кэш"""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Выход через TokenDestroyView удаляет токен и сбрасывает кэш"""
+    forget_token(instance.key)
+    invalidate_user(instance.user_id)
@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from .authentication import (CachedTokenAuthentication, invalidate_user,
+                             is_cache_shared, token_cache)
+from .models import User
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    """Запросы к БД при аутентификации по токену"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com')
+        cls.key = Token.objects.create(user=cls.user).key
+
+    def setUp(self):
+        token_cache.clear()
+        cache.clear()
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        user, token = self.authentication.authenticate_credentials(self.key)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(token.key, self.key)
+        return user
+
+    @patch('users.authentication.is_cache_shared', return_value=True)
+    def test_cache_hit_without_queries(self, is_cache_shared):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual(user.email, self.user.email)
+
+    @patch('users.authentication.is_cache_shared', return_value=True)
+    def test_invalidated_user_is_loaded_again(self, is_cache_shared):
+        self.authenticate()
+        invalidate_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+    def test_process_local_cache_is_not_used(self):
+        self.assertFalse(is_cache_shared())
+        self.authenticate()
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }})
+    def test_database_cache_is_not_used(self):
+        self.assertFalse(is_cache_shared())
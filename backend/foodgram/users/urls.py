@@ -2,6 +2,8 @@ from django.urls import include, path
 from djoser.views import TokenDestroyView
 from rest_framework.routers import DefaultRouter
 
+from foodgram.threadpool import run_in_thread_pool
+
 from .views import CustomUsersViewSet, TokenView
 
 app_name = 'users'
@@ -13,6 +15,7 @@ router_v1.register('users', CustomUsersViewSet, basename='users')
 
 urlpatterns = [
     path('', include(router_v1.urls)),
-    path('auth/token/login/', TokenView.as_view(), name='signup'),
+    path('auth/token/login/', run_in_thread_pool(TokenView.as_view()),
+         name='signup'),
     path('auth/token/logout/', TokenDestroyView.as_view(), name='signout'),
 ]
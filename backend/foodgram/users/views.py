@@ -1,4 +1,5 @@
 from django.db import DatabaseError
+from django.db.models import Count, OuterRef, Prefetch, Subquery
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import permissions, status
@@ -8,6 +9,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from foodgram.pagination import LimitPageNumberPagination
+from recipes.models import Recipe
 from .models import Follow, User
 from .serializers import SubscriptionSerializer, TokenCreateSerializer
 
@@ -41,10 +43,34 @@ class CustomUsersViewSet(UserViewSet):
         kwargs.setdefault('context', self.get_serializer_context())
         return SubscriptionSerializer(*args, **kwargs)
 
+    def get_recipes_limit(self):
+        try:
+            recipes_limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return max(recipes_limit, 0)
+
+    def get_subscriptions_queryset(self):
+        """Авторы, на которых подписан пользователь, с их рецептами"""
+        user = self.request.user
+        recipes = Recipe.objects.only('id', 'name', 'image', 'cooking_time',
+                                      'image_variants_for', 'author_id')
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author'))
+                .values('pk')[:recipes_limit]))
+        return (
+            User.objects.filter(following__user=user)
+            .with_is_subscribed(user)
+            .annotate(recipes_count=Count('recipes', distinct=True))
+            .prefetch_related(Prefetch('recipes', queryset=recipes))
+            .order_by('id')
+        )
+
     @action(detail=False, methods=('get',))
     def subscriptions(self, request):
-        self.get_serializer
-        queryset = User.objects.filter(following__user=request.user)
+        queryset = self.get_subscriptions_queryset()
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_subscribtion_serializer(page, many=True)
@@ -64,7 +90,8 @@ class CustomUsersViewSet(UserViewSet):
             return Response('Вы уже подписаны на автора!',
                             status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = self.get_subscribtion_serializer(subscribe.author)
+        serializer = self.get_subscribtion_serializer(
+            self.get_subscriptions_queryset().get(pk=subscribe.author_id))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_subscribe(self, request, author):